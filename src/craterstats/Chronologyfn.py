@@ -3,6 +3,7 @@
 
 import numpy as np
 import types
+import craterstats as cst
 import craterstats.gm as gm
 
 
@@ -32,9 +33,9 @@ class Chronologyfn:
         else:
             if '\n' in source: # multiline string is definition
                 txt = source + '\nchronology={\n name="null"\n}' # add null entry to force implied array
+                src = gm.read_textstructure(txt, from_string=True)
             else: # single line string is filename
-                txt = gm.read_textfile(source, as_string=True, ignore_hash=True)
-            src = gm.read_textstructure(txt, from_string=True)
+                src = cst.read_functions(source)
         
         self.definition=next((e for e in src['chronology'] if e['name']==identifier),None)
         if self.definition is None:
@@ -77,11 +78,28 @@ class Chronologyfn:
                 dt=t/1e4
                 return (self.N1(t+dt)-self.N1(t-dt))/(2.*dt)
 
-    def t(self,a0=None,n1=None):
+    def t(self,a0=None,n1=None,newton=False,rtol=1e-12,max_iter=20):
+        """
+        Invert N1(t): look up in table, optionally refined by Newton iteration
+
+        :param a0: log10 N1 value(s)
+        :param n1: N1 value(s), if a0 not given
+        :param newton: refine by Newton iteration using dN1/dt (accurate for young surfaces and beyond table)
+        :param rtol: relative tolerance for Newton iteration
+        :param max_iter: maximum Newton iterations
+        :return: time(s), Ga
+        """
         if not a0 is None:
-            n1=10**a0
-        
+            n1=10**np.asarray(a0, dtype=float)
+
         t=np.interp(n1,self.n1s,self.ts)
+        if newton: # iterate on log N1, near-linear in t for exponential part, so converges quickly beyond table
+            with np.errstate(divide='ignore', invalid='ignore'):
+                for _ in range(max_iter):
+                    n=self.N1(t)
+                    step=np.where(t > 0, np.log(n/n1)*n/self.phi(t), 0.)
+                    t=t-step
+                    if np.all(np.abs(step) <= rtol*t): break
         return t
              
     def getplotdata(self,phi=False,linear=False):
@@ -3,6 +3,7 @@
 
 import numpy as np
 import itertools as it
+import os
 import re
 import sys
 
@@ -13,8 +14,14 @@ class Cratercount:
     '''Reads crater count data; provides onward in various styles and binnings'''
 
     BINNINGS = ['pseudo-log', '20/decade', '10/decade', 'x2', 'root-2', '4th root-2', 'none'] #allowed binnings
+    CACHED = ['diam', 'fraction', 'lon', 'lat', 'area', 'perimeter', 'buffered'] #attributes stored in sidecar cache
 
-    def __init__(self,filename=None,filename2=None):
+    def __init__(self,filename=None,filename2=None,cache=False):
+        '''
+        :param filename: crater count file (.stat, .diam, .scc or .shp)
+        :param filename2: area file (.shp only)
+        :param cache: for .diam/.scc: reuse parsed data from sidecar file <filename>.npz, (re)writing it if missing or stale
+        '''
         self.filename=filename
         filetype = gm.filename(filename, 'e', max_ext_length=6) if filename else None
 
@@ -25,6 +32,7 @@ class Cratercount:
         self.perimeter=None
         self.buffered=False
         self.prebinned=False
+        self.cached=False
         if filetype:
             self.name = gm.filename(filename, 'n')
             self.n_sigma, self.n_trials = self.read_ra_file()
@@ -32,6 +40,7 @@ class Cratercount:
         bad_filetype = False
         try:
             if filetype == '.stat': self.ReadStatFile()
+            elif cache and filetype in ('.diam', '.scc') and self.read_cache(): pass
             elif filetype == '.diam': self.ReadDiamFile()
             # '.binned' disallowed for now
             # requires dedicated code to interact with 'range' specification beyond given bins
@@ -46,6 +55,8 @@ class Cratercount:
         except:
             sys.exit("Unable to read file: "+filename)
         if bad_filetype: sys.exit("Unrecognised crater count file type: " + filename)
+        if cache and filetype in ('.diam', '.scc') and not self.cached and not getattr(self, 'errormsg', None):
+            self.write_cache() # invalid data never cached, so always re-read and re-checked
 
 
     def __str__(self):
@@ -57,11 +68,54 @@ class Cratercount:
         if f:
             c = gm.read_textstructure(f)
             measures = sorted(set(c['n_sigma'].keys()) - {'bin'})
-            trials = [c[m]['n_trials'] for m in measures]
+            # trials per bin, which may differ if adaptive; earlier format has only n_trials for each measure
+            trials = [[int(e) for e in c[m]['bin_trials']['n_trials']] if 'bin_trials' in c[m] else [int(c[m]['n_trials'])]
+                      for m in measures]
             return c['n_sigma'],trials
         else:
             return None, None
 
+    def cache_filename(self):
+        return self.filename + '.npz'
+
+    def read_cache(self):
+        '''
+        Load parsed crater data from sidecar cache, if present and matching source file modification time and size
+
+        Attributes are restored with the types the file reader gave them.
+
+        :return: True if loaded
+        '''
+        f = self.cache_filename()
+        if not gm.file_exists(f): return False
+        st = os.stat(self.filename)
+        try:
+            with np.load(f) as z:
+                if z['source_mtime'] != st.st_mtime_ns or z['source_size'] != st.st_size:
+                    return False
+                for k, t in zip(z['cached_keys'], z['cached_types']):
+                    v = z[k].tolist()
+                    setattr(self, k, tuple(v) if t == 'tuple' else v)
+        except (OSError, ValueError, KeyError):
+            return False
+        self.prebinned = 0
+        self.cached = True
+        return True
+
+    def write_cache(self):
+        '''
+        Write parsed crater data to sidecar cache (silently skipped if not writable)
+        '''
+        st = os.stat(self.filename)
+        keys = [k for k in self.CACHED if getattr(self, k, None) is not None]
+        d = {k: np.asarray(getattr(self, k)) for k in keys}
+        types = [type(getattr(self, k)).__name__ for k in keys]
+        try:
+            with open(self.cache_filename(), 'wb') as f:
+                np.savez(f, source_mtime=st.st_mtime_ns, source_size=st.st_size, cached_keys=keys, cached_types=types, **d)
+        except OSError:
+            pass
+
 # ;****************************************************
 # ;             Generate missing details
 # ;****************************************************
@@ -121,18 +175,18 @@ class Cratercount:
         self.MakeBinGeometricMean()
 
     def ReadDiamFile(self):
-        s= gm.read_textstructure(self.filename)
+        s= gm.read_textstructure(self.filename, numeric_tables=True)
 
         c=s['crater']
-        diam=[float(e) for e in c['diameter']]
+        diam=np.asarray(c['diameter'], dtype=float)
 
         if 'reference_area' in c:                           #buffered case
             area=1. #nominal area
             self.buffered=True
-            frac=[area/float(e) for e in c['reference_area']]
+            frac=area/np.asarray(c['reference_area'], dtype=float)
         else:                                               #normal case
             area=float(s['area'])
-            frac=[float(e) for e in c['fraction']] if 'fraction' in c else [1.]*len(diam)
+            frac=np.asarray(c['fraction'], dtype=float) if 'fraction' in c else np.ones(len(diam))
 
         if (min(frac)<0 or max(frac)>1) and self.buffered==0:
             self.errormsg="Crater list in "+self.filename+" has invalid crater fractions."
@@ -140,11 +194,11 @@ class Cratercount:
             self.errormsg="Crater list in "+self.filename+" has undefined area."
 
 
-        diam,frac=zip(*sorted(zip(diam,frac),reverse=True))
+        q=np.lexsort((frac,diam))[::-1]     #descending by diameter, then fraction
 
         self.area=area
-        self.diam=diam
-        self.fraction=frac
+        self.diam=tuple(diam[q].tolist())
+        self.fraction=tuple(frac[q].tolist())
         self.prebinned=0
 
     def ReadBinnedFile(self):
@@ -167,20 +221,23 @@ class Cratercount:
 
 
     def ReadSCCfile(self):
-        s = gm.read_textstructure(self.filename)
+        s = gm.read_textstructure(self.filename, numeric_tables=True)
         c=s['crater']
-        diam=[float(e) for e in c['diam']]
-        frac=[float(e) for e in c['fraction']] if 'fraction' in c else [1. for e in diam]
+        diam=np.asarray(c['diam'], dtype=float)
+        frac=np.asarray(c['fraction'], dtype=float) if 'fraction' in c else np.ones(len(diam))
 
-        q=[i for i,e in sorted(enumerate(diam),key=lambda x:x[1])]     #get sorted indices
+        q=np.argsort(diam, kind='stable')     #get sorted indices
 
         self.area=float(re.findall(r'\s*[\d\.]*',s['Total_area'])[0])
         if 'Perimeter' in s.keys():
             self.perimeter = float(s['Perimeter'].split()[0])
         if 'Total_perimeter' in s.keys(): #for Thomas Heyer's OpenCraterTool
             self.perimeter = float(re.findall(r'\s*[\d\.]*',s['Total_perimeter'])[0])
-        self.diam=[diam[e] for e in q]
-        self.fraction=[frac[e] for e in q]
+        self.diam=diam[q].tolist()
+        self.fraction=frac[q].tolist()
+        if 'lon' in c and 'lat' in c:
+            self.lon=np.asarray(c['lon'], dtype=float)[q].tolist()
+            self.lat=np.asarray(c['lat'], dtype=float)[q].tolist()
         self.prebinned=0
 
     def ReadSHPfile(self):
@@ -208,25 +265,17 @@ class Cratercount:
              '#------------------------------------------------------------------------------------------------------------------------------']
 
         a=self.area
-        b=self.binned
-
-        for i in range(len(b['d_min'])):
-            if b['n'][i]>0:
-                s=(format(b['d_min'][i],'<7.5g')+
-                   format(b['n'][i],'>11.5g')+
-                   format(b['n'][i]/a,'>13.3E')+
-                   format(b['n'][i]/a/np.sqrt(b['n'][i]),'>12.3E')+
-                   format(b['ncum'][i],'>11.5g')+
-                   format(b['ncum'][i]/a,'>13.3E')+
-                   format(b['ncum'][i]/a/np.sqrt(b['ncum'][i]),'>12.3E')+
-                   format(b['d_mean'][i],'>12.4g')+
-                   format(b['n'][i]/b['bin_width'][i]/a,'>12.3E')+
-                   format(b['n'][i]/b['bin_width'][i]/a/np.sqrt(b['n_event'][i]),'>12.3E')+
-                   format(b['n_event'][i],'>12.5g'))
-                out+=[s]
-
-        out+=['#------------------------------------------------------------------------------------------------------------------------------']
-        gm.write_textfile(filename, out)
+        b={k: np.asarray(v)[np.asarray(self.binned['n'])>0] for k,v in self.binned.items()
+           if k in ('d_min','n','ncum','d_mean','bin_width','n_event')}
+
+        with open(filename, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(out))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                gm.write_table(file, '{0:<7.5g}{1:>11.5g}{2:>13.3E}{3:>12.3E}{4:>11.5g}{5:>13.3E}{6:>12.3E}{7:>12.4g}{8:>12.3E}{9:>12.3E}{10:>12.5g}',
+                               b['d_min'], b['n'], b['n']/a, b['n']/a/np.sqrt(b['n']),
+                               b['ncum'], b['ncum']/a, b['ncum']/a/np.sqrt(b['ncum']), b['d_mean'],
+                               b['n']/b['bin_width']/a, b['n']/b['bin_width']/a/np.sqrt(b['n_event']), b['n_event'])
+            file.write('\n#------------------------------------------------------------------------------------------------------------------------------')
 
 # ;****************************************************
 
@@ -1,6 +1,7 @@
 #  Copyright (c) 2021-2025, Greg Michael
 #  Licensed under BSD 3-Clause License. See LICENSE.txt for details.
 
+import functools
 import sys
 
 import numpy as np
@@ -14,13 +15,35 @@ import craterstats as cst
 import craterstats.gm as gm
 
 
+GRID_CACHE_SIZE = 64 # grids retained, keyed by PF/CF objects, diameter range and n_samples (least recently used discarded)
+
+@functools.lru_cache(maxsize=GRID_CACHE_SIZE)
+def cached_time_grid(cf,n_samples):
+    x=np.linspace(-10, 5, n_samples) # additive change to a0 (equidistant in fitting space)
+    a0=cf.a0(1.)
+    ts = cf.t(a0=a0+x)
+    dt = ts - np.roll(ts, 1)
+    dt[0] = dt[1]
+    phi = cf.phi(ts)
+    for e in (x,ts,dt,phi): e.flags.writeable = False # shared between instances
+    return x,a0,ts,dt,phi
+
+@functools.lru_cache(maxsize=GRID_CACHE_SIZE)
+def cached_unit_lambda(pf,cf,d_range,n_samples):
+    x,a0,_,_,_ = cached_time_grid(cf,n_samples)
+    Ncum10=np.log10(pf.evaluate("cumulative",d_range,a0))
+    lam = 10 ** (Ncum10[0] + x) - 10 ** (Ncum10[1] + x)
+    lam.flags.writeable = False
+    return lam
+
+
 class Craterpdf:
     """
     Create and plot age uncertainty distribution function
 
     """
 
-    def __init__(self, pf,cf,cc,d_range,k=None,lam=None,bcc=False,n_samples=5000):
+    def __init__(self, pf,cf,cc,d_range,k=None,lam=None,bcc=False,n_samples=5000,adaptive=False,tolerance=1e-6):
         """
         :param pf: Productionfn object
         :param cf: Chronologyfn object
@@ -30,13 +53,11 @@ class Craterpdf:
         :param lam: lambda for 1 Ga (if wish to force value, e.g. for probability calculation)
         :param bcc: buffered crater count?
         :param n_samples: number of samples for likelihood curve
+        :param adaptive: keep only the part of the time grid where likelihood is non-negligible (located by coarse pass)
+        :param tolerance: for adaptive sampling, maximum probability mass discarded from the tails
         """
 
-        x=np.linspace(-10, 5, n_samples) #additive change to a0 (equidistant in fitting space)
-        a0=cf.a0(1.)
-        self.ts = cf.t(a0=a0+x)
-        self.dt = self.ts - np.roll(self.ts, 1)
-        self.dt[0] = self.dt[1]
+        x, a0, ts, dt, phi = self.time_grid(cf, n_samples)
 
         if k is not None:
             self.k=k
@@ -48,7 +69,7 @@ class Craterpdf:
             q = np.where((b['d_min'] >= d_range[0]) & (b['d_max'] <= d_range[1]))
             self.k = np.sum(b['n_event'][q])
 
-        if not lam:
+        if lam is None:
             if bcc: #buffered count
                 if cc.perimeter is None:
                     sys.exit('Error: buffered-poisson calculation requires polygon perimeter in source file')
@@ -59,17 +80,80 @@ class Craterpdf:
                 I1=simpson(y,d)
                 lam = 10 ** (np.log10(I1) + x)   # lambda for each of self.ts
             else: #standard count
-                Ncum10=np.log10(pf.evaluate("cumulative",d_range,a0))
-                lam = (10 ** (Ncum10[0] + x) - 10 ** (Ncum10[1] + x)) * cc.area # lambda for each of self.ts
-
-        pdf0 = gm.poisson(self.k, lam) * cf.phi(self.ts) # include dC/dt factor
-        pdf0 = pdf0.astype(float)
-        if np.sum(pdf0)<1e-30: #force line peak if under-resolved
-            pdf0[np.searchsorted(lam, self.k)] = 1.
-        self.lam = lam
+                lam = self.unit_lambda(pf, cf, d_range, n_samples) * cc.area # lambda for each of self.ts
+
+        q = self.support(self.k, lam, phi, dt, tolerance) if adaptive else slice(None)
+        self.ts, self.dt, self.lam = ts[q], dt[q], lam[q]
+
+        pdf0 = self.likelihood(self.k, self.lam, phi[q])
         self.pdf = pdf0/np.sum(pdf0*self.dt)
         self.cdf = np.cumsum(self.pdf*self.dt)
 
+    @staticmethod
+    def time_grid(cf,n_samples):
+        """
+        Return sampling grid for likelihood curve (cached, read-only arrays)
+
+        :param cf: Chronologyfn object
+        :param n_samples: number of samples
+        :return: x (additive change to a0), a0 for 1 Ga, times, time steps, dN1/dt at times
+        """
+        return cached_time_grid(cf,n_samples)
+
+    @staticmethod
+    def unit_lambda(pf,cf,d_range,n_samples):
+        """
+        Return expected number of craters in diameter range per km^2 for each time of grid (cached, read-only array)
+
+        :param pf: Productionfn object
+        :param cf: Chronologyfn object
+        :param d_range: diameter range (km)
+        :param n_samples: number of samples
+        :return: lambda per unit area
+        """
+        return cached_unit_lambda(pf,cf,(float(d_range[0]),float(d_range[1])),n_samples)
+
+    @staticmethod
+    def likelihood(k,lam,phi):
+        """
+        Return unnormalised age likelihood, evaluated in log space and scaled to a peak of 1
+
+        :param k: number(s) of craters, broadcast against lam
+        :param lam: expected number of craters for each time of grid (last axis)
+        :param phi: dN1/dt for each time of grid
+        :return: likelihood, shape of broadcast k and lam
+        """
+        with np.errstate(divide='ignore'):
+            lp = gm.log_poisson(k, lam) + np.log(phi) # include dC/dt factor
+        return np.exp(lp - np.max(lp, axis=-1, keepdims=True))
+
+    @staticmethod
+    def support(k,lam,phi,dt,tolerance,step=10):
+        """
+        Locate range of time grid carrying all but a small fraction of the likelihood, from a coarse pass
+
+        :param k: number of craters
+        :param lam: expected number of craters for each time of grid
+        :param phi: dN1/dt for each time of grid
+        :param dt: time steps of grid
+        :param tolerance: maximum probability mass outside range (approximately, split between tails)
+        :param step: subsampling interval of coarse pass
+        :return: slice of grid
+        """
+        n = len(lam)
+        p = Craterpdf.likelihood(k, lam[::step], phi[::step]) * dt[::step]
+        c = np.cumsum(p) / np.sum(p)
+        i0 = max(np.searchsorted(c, tolerance / 2) - 1, 0) * step # widen by one coarse step each side
+        i1 = min((np.searchsorted(c, 1 - tolerance / 2) + 1) * step + 1, n)
+        return slice(i0, i1)
+
+    @staticmethod
+    def clear_grid_cache():
+        """
+        Discard cached grids, e.g. after modifying PF/CF definitions in place
+        """
+        cached_unit_lambda.cache_clear()
+        cached_time_grid.cache_clear()
 
     def t(self,cum_fraction):
         """
@@ -87,7 +171,7 @@ class Craterpdf:
         :param t: time, Ga
         :return: cum_fraction
         """
-        return np.interp(t,self.ts,self.cdf)
+        return np.interp(t,self.ts,self.cdf,left=0.,right=1.)
 
     def relative_probability(self,t):
         """
@@ -96,9 +180,10 @@ class Craterpdf:
         :param t: time, Ga
         :return: relative_probability
         """
-        return np.interp(t,self.ts,self.pdf)
+        return np.interp(t,self.ts,self.pdf,left=0.,right=0.)
 
-    def gaussian_percentiles(self,n=1):
+    @staticmethod
+    def gaussian_percentiles(n=1):
         """
         Return ordered Gaussian n-sigma percentiles
 
@@ -242,7 +327,10 @@ class Craterpdf:
         """
         # Discretisation of cdf biases result, since calculated for one edge, especially for narrow pdfs.
         # Finding midpoint to fix:
-        cdf2=(pdf2.cdf+np.roll(pdf2.cdf, 1))/2.
+        if np.array_equal(self.ts, pdf2.ts):
+            cdf2=(pdf2.cdf+np.roll(pdf2.cdf, 1))/2.
+        else: # different grids, e.g. adaptive sampling: evaluate at interval midpoints
+            cdf2=pdf2.cumulative_fraction(self.ts-self.dt/2.)
         P = np.sum(self.dt * self.pdf * cdf2)
         return P
 
@@ -253,7 +341,7 @@ class Craterpdf:
         :param t: other time, t
         :return: probability ratio pr(t)/pr(median) [usually <1. if median close to max]
         """
-        v = np.interp([self.t(0.5),t], self.ts, self.pdf)
+        v = self.relative_probability([self.t(0.5),t])
         r = v[1]/v[0]
         return r
 
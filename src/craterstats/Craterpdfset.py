@@ -0,0 +1,79 @@
+#  Copyright (c) 2026, Greg Michael
+#  Licensed under BSD 3-Clause License. See LICENSE.txt for details.
+
+import numpy as np
+
+import craterstats as cst
+
+
+class Craterpdfset:
+    """
+    Age uncertainty distribution functions for a set of crater counts sharing one PF/CF pair
+
+    Evaluated together on a common time grid: row i of pdf/cdf corresponds to count i.
+    Equivalent to creating a Craterpdf for each count (standard Poisson calculation), without per-object overhead.
+    Memory use is proportional to number of counts * n_samples.
+
+    """
+
+    def __init__(self,pf,cf,k,area,d_range,n_samples=5000):
+        """
+        :param pf: Productionfn object
+        :param cf: Chronologyfn object
+        :param k: numbers of craters in range, one per count
+        :param area: count areas (km^2): single value or one per count
+        :param d_range: diameter range (km): either common [d_min,d_max], or one pair per count
+        :param n_samples: number of samples for likelihood curve
+        """
+
+        self.k = np.atleast_1d(np.asarray(k, dtype=float))
+        n = len(self.k)
+        area = np.broadcast_to(np.asarray(area, dtype=float), (n,))
+        d_range = np.broadcast_to(np.asarray(d_range, dtype=float), (n, 2))
+
+        x, a0, self.ts, self.dt, phi = cst.Craterpdf.time_grid(cf, n_samples)
+
+        # lambda per unit area is shared between counts with the same diameter range
+        ranges, inverse = np.unique(d_range, axis=0, return_inverse=True)
+        unit_lam = np.array([cst.Craterpdf.unit_lambda(pf, cf, r, n_samples) for r in ranges])
+        self.lam = unit_lam[inverse.ravel()] * area[:, None]
+
+        pdf0 = cst.Craterpdf.likelihood(self.k[:, None], self.lam, phi)
+        self.pdf = pdf0 / np.sum(pdf0 * self.dt, axis=1)[:, None]
+        self.cdf = np.cumsum(self.pdf * self.dt, axis=1)
+
+    def __len__(self):
+        return len(self.k)
+
+    def t(self,cum_fraction):
+        """
+        Return times for interpolated percentiles, for each count
+
+        :param cum_fraction: percentile(s) as fraction
+        :return: times, shape (n_counts,) for single percentile, else (n_counts, n_percentiles)
+        """
+        f = np.asarray(cum_fraction, dtype=float)
+        fr = np.atleast_1d(f)
+        n, ns = self.cdf.shape
+
+        # cdf rows are non-decreasing: count of samples <= f is the searchsorted (right) index for every row
+        j = np.stack([np.sum(self.cdf <= e, axis=1) for e in fr], axis=1)
+        lo = np.clip(j - 1, 0, ns - 2)
+        rows = np.arange(n)[:, None]
+        c0, c1 = self.cdf[rows, lo], self.cdf[rows, lo + 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            w = np.clip(np.where(c1 > c0, (fr - c0) / (c1 - c0), 0.), 0., 1.)
+        res = self.ts[lo] + w * (self.ts[lo + 1] - self.ts[lo])
+        res = np.where(fr <= self.cdf[:, :1], self.ts[0], res)
+        res = np.where(fr >= self.cdf[:, -1:], self.ts[-1], res)
+
+        return res[:, 0] if f.ndim == 0 else res
+
+    def median1sigma(self):
+        """
+        Return times for median and 1-sigma percentiles, for each count
+
+        :return: times, shape (n_counts, 3)
+        """
+        g = cst.Craterpdf.gaussian_percentiles()
+        return self.t([g[i] for i in [1,0,2]])
@@ -151,7 +151,8 @@ class Craterplot:
             for i,m in enumerate(cps.measure):
                 cps.ax_ra.text(xr[0] - mg*.03, y[i], m, color=cps.palette[0], size=.5 * cps.scaled_pt_size,  va='center', ha='right')
                 cps.ax_ra.plot([xr[0] - mg*.027,xr[0] - mg*.005], [y[i]]*2, color=cps.palette[0], lw=.5 * cps.sz_ratio, linestyle=cst.LINESTYLES[m])
-            cps.ax_ra.text(xr[0] - mg * .005, y[-1], ', '.join(set(self.cratercount.n_trials))+" trials", color=cps.palette[0], size=.5 * cps.scaled_pt_size, va='center', ha='right')
+            n_trials = [f"{min(n)}–{max(n)}" if min(n) < max(n) else f"{max(n)}" for n in self.cratercount.n_trials]
+            cps.ax_ra.text(xr[0] - mg * .005, y[-1], ', '.join(dict.fromkeys(n_trials))+" trials", color=cps.palette[0], size=.5 * cps.scaled_pt_size, va='center', ha='right')
 
             xtickv, xtickname, _, xminorv = cst.Hartmann_bins([xr[0],xr[1]+.001])
             cps.ax_ra.spines['top'].set_position(('data', cst.n_sigma_scaling(3)))
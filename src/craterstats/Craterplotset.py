@@ -1,8 +1,10 @@
 #  Copyright (c) 2021-2025, Greg Michael
 #  Licensed under BSD 3-Clause License. See LICENSE.txt for details.
 import copy
+import math
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
@@ -42,6 +44,10 @@ class Craterplotset:
 
         self.cm2inch=1/2.54
 
+        # results of time-consuming calculations, kept for output in several formats
+        self.ra=None                #Randomnessanalysis
+        self.age_area_result=None   #from compute_age_area
+
         self.UpdateSettings({
             'title':None,
             'presentation':'differential',
@@ -831,9 +837,7 @@ class Craterplotset:
 
         # --- crater setup ---
         d_range = [dmin, 1000.]
-        cc = cst.Cratercount()
-        mid_d = np.sqrt(d_range[0] * d_range[1])
-        cc.diam = [mid_d]
+        area = 10 ** log_area
 
         a0 = self.cf.a0(10 ** log_age)
 
@@ -842,35 +846,9 @@ class Craterplotset:
             r = self.pf.evaluate("cumulative", d_range, a0=a)
             C[i] = r[0] - r[1]
 
-        # --- result arrays ---
-        zz = np.zeros((nsx, nsy))
-        kk = np.zeros((nsx, nsy))
-        ee = np.zeros((nsx, nsy))
-        lm = np.zeros((nsx, nsy))
-
-        # --- main loop ---
-        for i, xx in gm.iterator_with_progress(
-                enumerate(log_age),
-                total=nsx,
-                progress_queue=progress_queue
-        ):
-            for j, yy in enumerate(log_area):
-                area = 10 ** yy
-                lam = C[i] * area
-
-                k = np.random.poisson(lam) if lam < 1e5 else int(lam)
-
-                cc.area = area
-                pdf = cst.Craterpdf(self.pf, self.cf, cc, d_range, k=k, bcc=False, n_samples=2000)
-
-                t = pdf.median1sigma()
-                err = np.sqrt(t[2] / t[1]) - 1.0
-                ratio = t[0] / (10 ** xx)
-
-                zz[i, j] = 0 if np.isnan(err) else err
-                kk[i, j] = k
-                ee[i, j] = 1 if np.isnan(ratio) else ratio
-                lm[i, j] = lam
+        # --- main calculation ---
+        lm = np.outer(C, area)
+        zz, ee, kk = age_area_grid(self.pf, self.cf, d_range, lm, area, log_age, progress_queue=progress_queue)
 
         # --- return EVERYTHING needed for plotting ---
         return {
@@ -1022,3 +1000,89 @@ class Craterplotset:
         # figure -> display -> data
         x_data, y_data = self.ax.transData.inverted().transform(self.fig.transFigure.transform((x, y)))
         return x_data, np.log10(y_data)
+
+
+AGE_AREA_PARALLEL_MIN = 20000 # grid cells below which process startup costs more than it saves
+
+def age_area_grid(pf, cf, d_range, lm, area, log_age, seed=42, n_samples=2000, parallel=None, progress_queue=None):
+    """
+    Evaluate age-area uncertainty grid, one row per age, each with its own reproducible random stream
+
+    Results are independent of whether rows are evaluated in parallel.
+
+    :param pf: Productionfn object
+    :param cf: Chronologyfn object
+    :param d_range: diameter range (km)
+    :param lm: expected crater counts, shape (n_ages, n_areas)
+    :param area: areas (km^2), length n_areas
+    :param log_age: log10 of actual ages (Ga), length n_ages
+    :param seed: root seed; row i uses the i-th stream spawned from it
+    :param n_samples: number of samples for likelihood curves
+    :param parallel: use worker processes; by default, only for large grids
+    :param progress_queue: optional queue for progress reporting (for GUI), one step per row
+    :return: zz, ee, kk, each shape of lm: relative 1-sigma uncertainty of measured age; ratio of measured
+        (median) to actual age; simulated crater counts
+    """
+    nsx = len(log_age)
+    seeds = np.random.SeedSequence(seed).spawn(nsx)
+    zz, ee, kk = (np.zeros(lm.shape) for _ in range(3))
+    n_workers = max(1, os.cpu_count() - 1)
+    if parallel is None:
+        parallel = n_workers > 1 and lm.size >= AGE_AREA_PARALLEL_MIN
+
+    if not parallel:
+        for i, xx in gm.iterator_with_progress(enumerate(log_age), total=nsx, progress_queue=progress_queue):
+            zz[i], ee[i], kk[i] = age_area_row(pf, cf, d_range, lm[i], area, xx, seeds[i], n_samples=n_samples)
+        return zz, ee, kk
+
+    # pf, cf sent once to each worker, so that their cached time grids are reused for every row
+    size = max(1, math.ceil(nsx / (4 * n_workers)))
+    blocks = [range(i, min(i + size, nsx)) for i in range(0, nsx, size)]
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_age_area_worker, initargs=(pf, cf, d_range)) as executor:
+        futures = [executor.submit(age_area_rows, lm[b], area, log_age[b], [seeds[i] for i in b], n_samples) for b in blocks]
+        for i, _ in gm.iterator_with_progress(enumerate(log_age), total=nsx, progress_queue=progress_queue): # rows in order, as blocks complete
+            zz[i], ee[i], kk[i] = (e[i % size] for e in futures[i // size].result())
+    return zz, ee, kk
+
+_age_area_fns = None # (pf, cf, d_range) in worker process, set by init_age_area_worker
+
+def init_age_area_worker(pf, cf, d_range):
+    global _age_area_fns
+    _age_area_fns = (pf, cf, d_range)
+
+def age_area_rows(lm, area, log_age, seeds, n_samples):
+    """
+    Block of age rows in worker process, using functions received by init_age_area_worker
+
+    :param lm: expected crater counts for each row
+    :param area: areas (km^2)
+    :param log_age: log10 of actual age (Ga) for each row
+    :param seeds: seed for each row
+    :param n_samples: number of samples for likelihood curves
+    :return: arrays as from age_area_row, one row for each age
+    """
+    rows = [age_area_row(*_age_area_fns, e, area, xx, seed, n_samples=n_samples) for e, xx, seed in zip(lm, log_age, seeds)]
+    return tuple(np.array(e) for e in zip(*rows))
+
+def age_area_row(pf, cf, d_range, lm, area, log_age, seed, n_samples=2000):
+    """
+    Evaluate one age row of the age-area uncertainty grid
+
+    :param pf: Productionfn object
+    :param cf: Chronologyfn object
+    :param d_range: diameter range (km)
+    :param lm: expected crater counts for each area
+    :param area: areas (km^2)
+    :param log_age: log10 of actual age (Ga)
+    :param seed: seed for simulated counts (int or np.random.SeedSequence)
+    :param n_samples: number of samples for likelihood curves
+    :return: measured relative uncertainty, measured/actual age ratio, simulated crater counts
+    """
+    rng = np.random.default_rng(seed)
+    k = np.where(lm < 1e5, rng.poisson(np.minimum(lm, 1e5)), np.floor(lm))
+
+    t = cst.Craterpdfset(pf, cf, k, area, d_range, n_samples=n_samples).median1sigma()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        err = np.sqrt(t[:, 2] / t[:, 1]) - 1.0
+        ratio = t[:, 0] / (10 ** log_age)
+    return np.where(np.isnan(err), 0, err), np.where(np.isnan(ratio), 1, ratio), k
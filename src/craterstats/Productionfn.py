@@ -21,9 +21,9 @@ class Productionfn:
         else:
             if '\n' in source: # multiline string is definition
                 txt = source + '\n'+pf_type+'={\n name="null"\n}' # add null entry to force implied array
+                src = gm.read_textstructure(txt, from_string=True)
             else: # single line string is filename
-                txt = gm.read_textfile(source, as_string=True, ignore_hash=True)
-            src = gm.read_textstructure(txt, from_string=True)
+                src = cst.read_functions(source)
         
         self.definition=next((e for e in src[pf_type] if e['name']==identifier), None)
         if self.definition is None:
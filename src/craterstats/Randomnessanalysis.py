@@ -2,16 +2,20 @@
 #  Licensed under BSD 3-Clause License. See LICENSE.txt for details.
 
 from collections import namedtuple
+from collections.abc import Mapping
 from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import functools
 import math
-import multiprocessing
 import os
+import time
+import zlib
 
 import astropy_healpix as hpx
 import astropy.units as u
 import numpy as np
 import matplotlib.ticker as ticker
-from scipy.spatial import SphericalVoronoi
+from scipy.spatial import cKDTree, SphericalVoronoi
 import shapely as shp
 import shapely.affinity as shp_aff
 import spherely as sph
@@ -30,14 +34,46 @@ class Randomnessanalysis(cst.Spatialcount):
         super().__init__(filename,area_file)
         self.init_Cratercount()
         self.montecarlo = {}
-        self.max_threads = os.cpu_count()-1
+        self.max_threads = max(1, os.cpu_count()-1)
         self.ra_file = (out if out else self.name) + "_ra.txt"
+        self.trials_file = gm.filename(self.ra_file, 'pn') + '.npz'
+        self.checkpoint_file = gm.filename(self.ra_file, 'pn') + '_checkpoint.npz'
+        self.checkpoint = {}
         self.progress_queue = progress_queue
+        self.executor = None # worker pool, kept between Monte Carlo runs
+        self.executor_key = None
         self.read()
+        self.read_checkpoint()
         binning='root-2'
         self.cc.apply_binning(binning, offset=0.)
         self.plot_reduction_factor = None
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def shutdown(self):
+        """
+        Stop worker pool
+        """
+        if self.executor:
+            self.executor.shutdown()
+        self.executor = None
+        self.executor_key = None
+
+    def get_executor(self, self_pp):
+        """
+        Worker pool shared by all bins and measures; only recreated if state sent to workers by initializer changes
+        """
+        key = (self_pp.hp.nside, self_pp.planetary_radius, self_pp.area, id(self_pp.polygon), self_pp.max_threads)
+        if key != self.executor_key:
+            self.shutdown()
+            self.executor = ProcessPoolExecutor(max_workers=self_pp.max_threads, initializer=init_worker, initargs=(self_pp,))
+            self.executor_key = key
+        return self.executor
+
     def init_Cratercount(self):
         self.cc = cst.Cratercount()
         self.cc.diam = self.diam
@@ -52,6 +88,13 @@ class Randomnessanalysis(cst.Spatialcount):
         else:
             print(msg)
 
+    @functools.cached_property
+    def polygon_cells(self):
+        """
+        Classification of cells for point-in-polygon test (see classify_cells): built on first Monte Carlo run only
+        """
+        return classify_cells(self.polygon, self.xr, self.yr, self.area, self.planetary_radius)
+
     def establish_hpx(self,n):
         """
         establish HEALpix grid for 2d binning
@@ -137,9 +180,27 @@ class Randomnessanalysis(cst.Spatialcount):
             return pts,ids,hpd
 
 
-    def montecarlo_split(self, measure, self_pp, staggered=False):
+    @staticmethod
+    def converged(m0, m, tolerance):
+        """
+        Test whether n_sigma from trials m is known to within tolerance
+
+        Half-width of approximate 95% confidence interval of n_sigma=(m0-mn)/sd, from standard errors of mean and
+        standard deviation: se^2 = (1 + n_sigma^2/2)/n. Tolerance is taken relative to |n_sigma| where that exceeds 1,
+        so clearly non-random bins stop early.
+        """
+        n = len(m)
+        if n < ADAPTIVE_BATCH:
+            return False
+        n_sigma = (m0 - np.mean(m)) / np.std(m)
+        return 1.96 * math.sqrt((1 + n_sigma**2 / 2) / n) <= tolerance * max(1., abs(n_sigma))
+
+    def montecarlo_split(self, measure, self_pp, previous=None, staggered=False, tolerance=None):
         """
         Prepare separate runs across bin range
+
+        previous: trials already available for each bin (from earlier run or checkpoint); only missing trials are run
+        tolerance: if set, run trials in batches for each bin until n_sigma converges (see converged), up to self_pp.trials
         """
         match measure:
             case 'sdaa': min_count = 4
@@ -149,41 +210,81 @@ class Randomnessanalysis(cst.Spatialcount):
         for b,n in zip(self.cc.binned['d_min'],self.cc.binned['n_event']):
             if n >= min_count:
                 bin = f"{np.log2(b):.3g}"
+                m = list(previous.get(bin, [])[:self_pp.trials]) if previous else []
                 msg = f"{measure}, bin {bin}: {gm.diameter_range([b,b*math.sqrt(2)],2)}, {n} craters"
+                if m:
+                    msg += f" ({len(m)} trials done)"
                 self.print(msg)
 
+                def checkpoint(new_trials):
+                    self.checkpoint[f"{measure}/{bin}"] = np.array(m + new_trials)
+                    self.write_checkpoint()
+
+                if tolerance:
+                    pts, ids, hpd = self.get_bin_craters(bin)
+                    m0, _ = evaluate_randomness(self_pp, pts, ids, hpd, geometry=False)
+
                 debug = False
-                if debug:
-                    m = montecarlo_serial(self_pp, b, n)
-                else: # do parallel monte carlo for random configs
-                    m = montecarlo_pp(self_pp, b, n, progress_queue=self.progress_queue)
+                while len(m) < self_pp.trials and not (tolerance and self.converged(m0, m, tolerance)):
+                    # trials are independently seeded, so batches give same values as a single run
+                    batch = self_pp._replace(trials=min(self_pp.trials, len(m) + ADAPTIVE_BATCH)) if tolerance else self_pp
+                    if debug:
+                        m += montecarlo_serial(batch, b, n, start=len(m))
+                    else: # do parallel monte carlo for random configs
+                        m += montecarlo_pp(batch, b, n, start=len(m), progress_queue=self.progress_queue, checkpoint=checkpoint,
+                                           executor=self.get_executor(self_pp))
+                if tolerance:
+                    self.print(f"{len(m)} trials")
                 self.montecarlo[measure]['trials'][bin] = m
 
-    def run_montecarlo(self, trials, measure):
-        np.random.seed(42)
+    def have_trials(self, measure, trials, tolerance=None):
+        """
+        Test whether existing results already satisfy requested number of trials (or cap and tolerance, if adaptive)
+        """
+        if measure not in self.montecarlo or self.montecarlo[measure]['n_trials'] < trials:
+            return False
+        done = self.montecarlo[measure].get('tolerance')
+        return done is None or (tolerance is not None and done <= tolerance)
+
+    def run_montecarlo(self, trials, measure, tolerance=None):
+        """
+        trials: number of trials for each bin; upper limit if tolerance given
+        tolerance: stop trials for each bin once n_sigma has converged to this tolerance
+        """
         self.establish_hpx(trials)
-        self_pp = self.self_pp(trials, measure)
 
-        if not measure in self.montecarlo or not self.montecarlo[measure]['n_trials'] >= trials: # skip montecarlo if already have data
+        if not self.have_trials(measure, trials, tolerance): # skip montecarlo if already have data
+            self_pp = self.self_pp(trials, measure, sprinkle=True)
+            previous = dict(self.montecarlo[measure]['trials']) if measure in self.montecarlo else {}
+            for key, v in self.checkpoint.items(): # take partial results from interrupted run, if longer
+                m, bin = key.split('/')
+                if m == measure and len(v) > len(previous.get(bin, [])):
+                    previous[bin] = list(v)
             self.montecarlo[measure] = {'n_trials':trials}
-            self.montecarlo_split(measure, self_pp)
+            if tolerance:
+                self.montecarlo[measure]['tolerance'] = tolerance
+            self.montecarlo_split(measure, self_pp, previous=previous, tolerance=tolerance)
 
     def calculate_stats(self):
         for measure in self.montecarlo.keys():
             self_pp = self.self_pp(self.montecarlo[measure]['n_trials'], measure)
+            trials = self.montecarlo[measure]['trials']
+            saved = self.montecarlo[measure].get('stats', {}) if isinstance(trials, Trialstore) else {}
             self.montecarlo[measure]['stats'] = {}
-            stats = namedtuple('stats', ['m0', 'p2', 'mn', 'sd', 'n_sigma','percentile'])
-            for bin in self.montecarlo[measure]['trials'].keys():
+            for bin in trials.keys():
 
                 pts, ids, hpd = self.get_bin_craters(bin)
                 m0,p2 = evaluate_randomness(self_pp,pts, ids, hpd)
                 #print(f"Bin: {bin} d_min:{2**float(bin):0.3g} number:{len(pts)} Actual value of measure: {m0:0.3g}")
 
-                m = self.montecarlo[measure]['trials'][bin]
+                if bin in saved: # trials unchanged since written: only geometry needed, trial values not loaded
+                    self.montecarlo[measure]['stats'][bin] = saved[bin]._replace(p2=p2)
+                    continue
+                m = trials[bin]
                 mn,sd = (np.mean(m),np.std(m))
                 n_sigma = (m0-mn)/sd
                 percentile = np.searchsorted(np.sort(m), m0) / len(m) * 100
-                self.montecarlo[measure]['stats'][bin] = stats(m0=m0, p2=p2, mn=mn, sd=sd, n_sigma=n_sigma,percentile = percentile)
+                self.montecarlo[measure]['stats'][bin] = stats_tuple(m0=m0, p2=p2, mn=mn, sd=sd, n_sigma=n_sigma,percentile = percentile)
 
     def plot_histogram(self,cps,measure,bin,ax0=None,sz_ratio=1.): # mark median and 1 sd band
         if ax0:
@@ -196,7 +297,7 @@ class Randomnessanalysis(cst.Spatialcount):
         m = self.montecarlo[measure]['trials'][bin]
         m0 = res.m0
 
-        nbins = round(math.sqrt(self.montecarlo[measure]['n_trials']) + 5)
+        nbins = round(math.sqrt(len(m)) + 5)
 
         h,be = np.histogram(m, bins=nbins)
         bar_width = np.diff(be)
@@ -387,7 +488,9 @@ class Randomnessanalysis(cst.Spatialcount):
         for y in [-3,-1,0,1,3]:
             ax.text(xr[1], cst.n_sigma_scaling(y)+dy, f"{abs(y):>2}", color=cps.palette[0], size=1. * cps.scaled_pt_size * sz_ratio, va='center', ha='left')
 
-        ax.text(xr[0] - mg*.004, 0, measure + f"\n{self.montecarlo[measure]['n_trials']} trials", color=cps.palette[0], size=1.2 * cps.scaled_pt_size * sz_ratio,  va='center', ha='right')
+        n = [len(v) for v in self.montecarlo[measure]['trials'].values()] # may differ between bins, if adaptive
+        n_trials = f"{min(n)}–{max(n)}" if min(n) < max(n) else f"{max(n)}"
+        ax.text(xr[0] - mg*.004, 0, measure + f"\n{n_trials} trials", color=cps.palette[0], size=1.2 * cps.scaled_pt_size * sz_ratio,  va='center', ha='right')
 
         xtickv,xtickname,_,xminorv = cst.Hartmann_bins(xr)
         ax.spines['top'].set_position(('data', cst.n_sigma_scaling(3)))
@@ -401,7 +504,12 @@ class Randomnessanalysis(cst.Spatialcount):
 
 
 
-    def write(self):
+    def write(self, completed=None):
+        """
+        Write results for all measures
+
+        completed: measure whose Monte Carlo run is complete; its checkpoint entries are discarded
+        """
         s = ['# Randomness analysis',
               f'version = {cst.__version__}',
               f'source = "{self.filename}"',
@@ -421,20 +529,57 @@ class Randomnessanalysis(cst.Spatialcount):
                    + table + ['}'])
         s += n_sigma
 
+        arrays = {}
         for measure in self.montecarlo:
-            trials = (
-                ['trials  = {index, ' + ", ".join([b for b in self.montecarlo[measure]['trials']])]
-                + ["\t".join([f"{t:<12}"] + [f"{v[t]:<12.7g}" for bin,v in self.montecarlo[measure]['trials'].items()])
-                            for t in range(self.montecarlo[measure]['n_trials']) ]
-                + ['}'])
+            mc = self.montecarlo[measure]
+            for bin, v in mc['trials'].items():
+                arrays[f"{measure}/{bin}"] = np.asarray(v, dtype=float)
+            if 'stats' in mc and mc['stats']:
+                arrays[f"{measure}/bins"] = np.array(list(mc['stats'].keys()))
+                arrays[f"{measure}/stats"] = np.array([[getattr(e, k) for k in STATS_SAVED] for e in mc['stats'].values()])
             s1 = (
                 ['#',f'{measure} = {{',
-                f'n_trials = {self.montecarlo[measure]['n_trials']}']
-                + trials
+                f'n_trials = {mc['n_trials']}']
+                + ([f'tolerance = {mc['tolerance']:g}'] if 'tolerance' in mc else [])
+                + ['bin_trials = {bin, n_trials']
+                + [f"{bin:<12}\t{len(v)}" for bin,v in mc['trials'].items()]
+                + ['}']
                 + ['}'])
             s += s1
+        savez_atomic(self.trials_file, arrays) # trial values: binary, to keep text file small and fast to read
         gm.write_textfile(self.ra_file,s)
 
+        # completed trials now recorded in ra_file; keep checkpoint entries of other measures
+        if completed:
+            self.checkpoint = {k: v for k, v in self.checkpoint.items() if k.split('/')[0] != completed}
+            if self.checkpoint:
+                self.write_checkpoint()
+            elif gm.file_exists(self.checkpoint_file):
+                os.remove(self.checkpoint_file)
+
+    def checkpoint_source(self):
+        """
+        Identify crater count to which checkpoint belongs
+        """
+        return {'_source': np.array(os.path.abspath(self.filename)), '_n': np.array(len(self.diam))}
+
+    def write_checkpoint(self):
+        """
+        Save trials completed so far, for each measure/bin, so that an interrupted analysis can be resumed
+        """
+        savez_atomic(self.checkpoint_file, self.checkpoint | self.checkpoint_source())
+
+    def read_checkpoint(self):
+        if gm.file_exists(self.checkpoint_file):
+            with np.load(self.checkpoint_file) as z:
+                checkpoint = {k: z[k] for k in z.files}
+            source = {k: checkpoint.pop(k, None) for k in self.checkpoint_source()}
+            if any(v is None or v != e for v, e in zip(source.values(), self.checkpoint_source().values())):
+                self.print(f"Ignoring checkpoint from different crater count: {self.checkpoint_file}")
+                return
+            self.checkpoint = checkpoint
+            self.print(f"Resuming from checkpoint: {self.checkpoint_file}")
+
     def read(self):
         # allow read from source file location, but write will still be to current dir or -o
         possible_locations = (self.ra_file, gm.filename(self.filename, 'pn1','_ra.txt'))
@@ -446,89 +591,184 @@ class Randomnessanalysis(cst.Spatialcount):
                     self.montecarlo[name] = {
                         'n_trials':int(c[name]['n_trials']),
                         }
-                    self.montecarlo[name]['trials'] = {}
-                    for b in list(c[name]['trials'].keys())[1:]:
-                        self.montecarlo[name]['trials'][b] = [float(e) for e in c[name]['trials'][b]]
-
-    def self_pp(self,trials, measure):
+                    if 'tolerance' in c[name]:
+                        self.montecarlo[name]['tolerance'] = float(c[name]['tolerance'])
+                    if 'trials' in c[name]: # earlier format, with trials in text file
+                        self.montecarlo[name]['trials'] = {}
+                        for b in list(c[name]['trials'].keys())[1:]:  # bins with fewer trials (adaptive) are padded with '-'
+                            self.montecarlo[name]['trials'][b] = [float(e) for e in c[name]['trials'][b] if e != '-']
+                    else:
+                        trials_file = gm.filename(f, 'pn') + '.npz'
+                        bins = c[name]['bin_trials']['bin']
+                        files = []
+                        if gm.file_exists(trials_file):
+                            with np.load(trials_file) as z:
+                                files = z.files
+                        if any(f"{name}/{b}" not in files for b in bins):
+                            self.print(f"Trials for {name} missing from {trials_file}: to be recalculated")
+                            del self.montecarlo[name]
+                            continue
+                        self.montecarlo[name]['trials'] = Trialstore(trials_file, name, bins)
+                        self.montecarlo[name]['stats'] = read_stats(trials_file, name)
+
+    def self_pp(self,trials, measure, sprinkle=False):
         """
         tuple of vars for parallel processing
+
+        sprinkle: include polygon_cells, needed only to sprinkle random craters for trials (built on first use)
         """
-        return self_pp_tuple(trials=trials,measure=measure,**{key: getattr(self, key) for key in attrs_pp[:-2]})
+        return self_pp_tuple(trials=trials,measure=measure,
+                             **{key: getattr(self, key) if key != 'polygon_cells' or sprinkle else None for key in attrs_pp[:-2]})
+
+
+stats_tuple = namedtuple('stats', ['m0', 'p2', 'mn', 'sd', 'n_sigma','percentile'])
+STATS_SAVED = ['m0', 'mn', 'sd', 'n_sigma', 'percentile'] # p2 (geometry for plotting) is recalculated
+
+class Trialstore(Mapping):
+    """
+    Read-only mapping of bin to trial values for one measure, each loaded from npz file only when accessed
+    """
+    def __init__(self, filename, measure, bins):
+        self.filename = filename
+        self.measure = measure
+        self.bins = list(bins)
+
+    def __getitem__(self, bin):
+        if bin not in self.bins:
+            raise KeyError(bin)
+        with np.load(self.filename) as z: # file not held open, so can be overwritten by write()
+            return z[f"{self.measure}/{bin}"]
+
+    def __iter__(self):
+        return iter(self.bins)
+
+    def __len__(self):
+        return len(self.bins)
+
+def read_stats(filename, measure):
+    """
+    Stats saved with trials, without geometry (p2=None): sufficient for n_sigma plot without recalculation
+    """
+    with np.load(filename) as z:
+        if f"{measure}/stats" not in z.files:
+            return {}
+        bins, values = z[f"{measure}/bins"], z[f"{measure}/stats"]
+    return {str(b): stats_tuple(p2=None, **dict(zip(STATS_SAVED, v))) for b, v in zip(bins, values)}
+
+def savez_atomic(filename, arrays):
+    """
+    Write npz via temporary file, never leaving a partly written file
+    """
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, filename)
 
 #######################################################
 # standalone functions required for parallel processing
 # note that 'self' in routines below is not class instance, but analogous self_pp namedtuple
 #######################################################
 
-attrs_pp = ['hp', 'planetary_radius', 'area', 'enclosing_area', 'polygon', 'xr', 'yr', 'max_threads','trials','measure']
+attrs_pp = ['hp', 'planetary_radius', 'area', 'enclosing_area', 'polygon', 'polygon_cells', 'xr', 'yr', 'max_threads','trials','measure']
 self_pp_tuple = namedtuple('self_pp_tuple', attrs_pp)
 
-def evaluate_randomness(self_pp, pts, ids, hpd):
+def evaluate_randomness(self_pp, pts, ids, hpd, geometry=True):
     """
     Evaluate randomness measure
+
+    geometry: also return geometry for plotting (neighbours or Voronoi polygons); not needed for trials
     """
     match self_pp.measure:
         case 'm2cnd':
             measure, p2 = kth_nearest_neighbour_pp(self_pp, pts, ids, hpd, k=2)  # p2 are neighbours (for plotting real config)
         case 'sdaa':
-            measure, p2 = sdaa(self_pp, pts, ids, hpd)
+            measure, p2 = sdaa(self_pp, pts, ids, hpd, geometry=geometry)
     return measure, p2
 
+def trial_rng(measure, bin, trial_index):
+    """
+    Independent random generator for each trial: equivalent to spawning from SeedSequence(42) by (measure, bin, trial)
+    so results do not depend on process scheduling, and trials can be computed in any order or place
+    """
+    key = (Randomnessanalysis.MEASURES.index(measure), zlib.crc32(bin.encode()), trial_index)
+    return np.random.default_rng(np.random.SeedSequence(42, spawn_key=key))
+
 def run_trial(self_pp, b, n, trial_index):
-    pts, ids, hpd = sprinkle_discs_pp(self_pp, n, b)  # Generate points and ids
-    m, _ = evaluate_randomness(self_pp, pts, ids, hpd)
+    rng = trial_rng(self_pp.measure, f"{np.log2(b):.3g}", trial_index)
+    pts, ids, hpd = sprinkle_discs_pp(self_pp, n, b, rng=rng)  # Generate points and ids
+    m, _ = evaluate_randomness(self_pp, pts, ids, hpd, geometry=False)
     return m
 
-def run_trial_wrapper(self_pp, b, n, trial_index, progress):
-    result = run_trial(self_pp, b, n, trial_index)
-    if progress is not None:
-        progress.value += 1 # Update shared progress
-    return result
+_self_pp = None # per-worker copy of self_pp, set once by pool initializer rather than pickled with every task
+
+def init_worker(self_pp):
+    global _self_pp
+    _self_pp = self_pp
+
+def run_trials(b, n, trial_indices, measure):
+    """
+    Block of trials in worker process, using self_pp received by init_worker
+    """
+    self_pp = _self_pp._replace(measure=measure) # pool may be reused for other measures
+    return np.array([run_trial(self_pp, b, n, i) for i in trial_indices])
+
+CHECKPOINT_INTERVAL = 60 # seconds between checkpoints of completed trials
+ADAPTIVE_BATCH = 100 # trials between convergence tests, and minimum number of trials, with tolerance
+MAX_CHUNK = 50 # upper limit on trials per task, to keep progress reporting and checkpoints responsive
+
+def chunks(start, stop, n_workers):
+    """
+    Split trial index range into blocks: about 4 per worker for load balancing, at most MAX_CHUNK trials each
+    """
+    size = min(MAX_CHUNK, max(1, math.ceil((stop - start) / (4 * n_workers))))
+    return [range(i, min(i + size, stop)) for i in range(start, stop, size)]
 
-def montecarlo_pp(self_pp, b, n, progress_queue=None):
+def montecarlo_pp(self_pp, b, n, start=0, progress_queue=None, checkpoint=None, executor=None):
     """
-    Single Monte Carlo run - parallel using processes with a Manager for shared progress.
+    Single Monte Carlo run - parallel using processes, each running blocks of trials
     Parameters:
     - self_pp: object containing max_threads and trials attributes
     - b: parameter for trials
     - n: parameter for trials
-    - callback: optional callback function (for GUI)
+    - start: index of first trial (earlier trials already done)
+    - progress_queue: optional queue for progress reporting (for GUI)
+    - checkpoint: optional function(measures) called periodically with results so far, and on completion
+    - executor: optional existing pool, initialised with init_worker; otherwise a new pool is created for this run
 
     Returns:
     - measures: list of results from the trials
     """
-    # Manager for shared progress
-    with multiprocessing.Manager() as manager:
-        progress = manager.Value('i', 0)  # Shared integer to track progress
-
-        with ProcessPoolExecutor(max_workers=self_pp.max_threads) as executor:
-            trial_indices = range(self_pp.trials)
-            args = [(self_pp, b, n, trial_index, progress) for trial_index in trial_indices]
-
-            # Submit tasks to executor and track futures
-            futures = [executor.submit(run_trial_wrapper, *arg) for arg in args]
-
-            # Use iterator_with_progress to handle progress reporting
-            progress_iter = gm.iterator_with_progress(enumerate(futures), total=self_pp.trials, progress_queue=progress_queue)
-
-            measures = []
-            for i, future in progress_iter:
-                result = future.result()  # Get result of completed trial
-                measures.append(result)
+    if start >= self_pp.trials:
+        return []
+
+    blocks = chunks(start, self_pp.trials, self_pp.max_threads)
+    pool = contextlib.nullcontext(executor) if executor else \
+        ProcessPoolExecutor(max_workers=self_pp.max_threads, initializer=init_worker, initargs=(self_pp,))
+    with pool as executor:
+        futures = [executor.submit(run_trials, b, n, block, self_pp.measure) for block in blocks]
+
+        # Use iterator_with_progress to handle progress reporting
+        progress_iter = gm.iterator_with_progress(enumerate(futures), total=len(futures), progress_queue=progress_queue)
+
+        measures = []
+        t_checkpoint = time.time()
+        for i, future in progress_iter:
+            measures.extend(future.result())  # results of completed block, in trial order
+            if checkpoint and time.time() - t_checkpoint > CHECKPOINT_INTERVAL:
+                checkpoint(measures)
+                t_checkpoint = time.time()
+    if checkpoint:
+        checkpoint(measures)
     return measures
 
-def montecarlo_serial(self_pp, b, n, progress_queue=None):
+def montecarlo_serial(self_pp, b, n, start=0, progress_queue=None):
     """
     Single Monte Carlo run. - serial - use for debugging only
     """
     measures = []
 
-    for trial_index in range(self_pp.trials):
-        result = run_trial_wrapper(
-            self_pp, b, n, trial_index, None  # no shared progress
-        )
-        measures.append(result)
+    for trial_index in range(start, self_pp.trials):
+        measures.append(run_trial(self_pp, b, n, trial_index))
 
         if progress_queue is not None:
             progress_queue.put(trial_index + 1)
@@ -537,51 +777,60 @@ def montecarlo_serial(self_pp, b, n, progress_queue=None):
 
 
 
-def random_points_pp(self ,n):
+def random_points_pp(self ,n, rng=np.random):
     # consider integral of cos(lat): sin(lat) - range varies from -1 to 1 for -180 to 180
     y0 = np.sin(np.radians(self.yr[0])) # move to init?
     y1 = np.sin(np.radians(self.yr[1]))
-    y = np.degrees(np.asin(np.random.uniform(y0, y1, n)))
-    x = np.random.uniform(self.xr[0], self.xr[1], n)
-    return zip(x ,y)
+    y = np.degrees(np.asin(rng.uniform(y0, y1, n)))
+    x = rng.uniform(self.xr[0], self.xr[1], n)
+    return x, y
+
+def lonlat_to_xyz(lon, lat):
+    """
+    unit vectors for arrays of lon, lat (degrees)
+    """
+    lon_rad, lat_rad = np.radians(lon), np.radians(lat)
+    return np.column_stack((np.cos(lat_rad) * np.cos(lon_rad), np.cos(lat_rad) * np.sin(lon_rad), np.sin(lat_rad)))
 
-def sprinkle_discs_pp(self ,n ,diam):
+def sprinkle_discs_pp(self ,n ,diam, rng=np.random):
     """
     generate z random points in enclosing area
     find those in actual area
-    find non-overlapping (could optimise with 2d spatial bin search)
-    take first n good points
+    place them in turn, each erasing earlier points closer than diam/2, until n remain
+
+    Batched: point i survives placement of points up to m if its first later neighbour (within diam/2), L_i, is beyond m;
+    so the count after each placement follows from a cumulative sum, without placing points one at a time.
     """
     expected_hit_rate = self.area /self.enclosing_area
-    angular_radius = diam / self.planetary_radius
-    hpd = {}
+    chord = 2 * math.sin(diam / (4 * self.planetary_radius)) # unit-sphere chord length for great-circle distance diam/2
+    lon, lat = np.empty(0), np.empty(0)
     count = 0
 
     while count < n:
         shortfall = n - count
         z = int(1.2 * shortfall / expected_hit_rate) + 10  # guess at required number of points
-        p0 = random_points_pp(self,z)
-        for lon,lat in p0:
-            pt = sph.create_point(longitude=lon, latitude=lat)
-            if sph.within(pt, self.polygon):
-
-                # erase existing craters closer than diam/2
-                hpx_neighbours = self.hp.cone_search_lonlat(lon*u.deg, lat*u.deg, angular_radius*u.rad)
-                for id in hpx_neighbours:
-                    if id in hpd:
-                        len0 = len(hpd[id])
-                        hpd[id] = [e for e in hpd[id] if sph.distance(pt, e, radius = self.planetary_radius) > diam/2]
-                        count += len(hpd[id]) - len0
-
-                # add new point
-                id0 = self.hp.lonlat_to_healpix(lon*u.deg, lat*u.deg)
-                if id0 not in hpd:
-                    hpd[id0] = [pt]
-                else:
-                    hpd[id0].append(pt)
-                count += 1
-                if count >= n: # should never exceed
-                    break
+        x, y = random_points_pp(self, z, rng=rng)
+        inside = within_polygon(self, x, y)
+        lon, lat = np.concatenate((lon, x[inside])), np.concatenate((lat, y[inside]))
+
+        # first later neighbour of each point: the point which erases it
+        pairs = cKDTree(lonlat_to_xyz(lon, lat)).query_pairs(chord, output_type='ndarray')
+        first_later = np.full(len(lon), len(lon))
+        np.minimum.at(first_later, pairs[:, 0], pairs[:, 1])
+        alive = np.cumsum(1 - np.bincount(first_later, minlength=len(lon) + 1)[:-1])
+
+        reached = np.nonzero(alive >= n)[0]
+        m = reached[0] if len(reached) else len(lon) - 1
+        count = alive[m] if len(alive) else 0
+
+    q = np.nonzero(first_later[:m + 1] > m)[0]
+    hp_ids = self.hp.lonlat_to_healpix(lon[q] * u.deg, lat[q] * u.deg)
+    hpd = {}
+    for pt, id in zip(sph.points(lon[q], lat[q]), hp_ids):
+        if id not in hpd:
+            hpd[id] = [pt]
+        else:
+            hpd[id].append(pt)
 
     pts,ids = zip(*[(e, key) for key, id_list in hpd.items() for e in id_list])
     return pts,ids,hpd
@@ -589,73 +838,130 @@ def sprinkle_discs_pp(self ,n ,diam):
 def kth_nearest_neighbour_pp(self, pts,ids,hpd, k=1):
     """
     find k_th nearest neighbour list
+
+    k-d tree query on unit vectors gives chord lengths for all points at once; converted to great-circle distance
+    """
+    pts = np.asarray(pts, dtype=object)
+    xyz = lonlat_to_xyz(sph.get_x(pts), sph.get_y(pts))
+    chord, index = cKDTree(xyz).query(xyz, k=[k + 1]) # nearest is point itself
+    distances = 2 * self.planetary_radius * np.arcsin(np.minimum(chord[:, 0] / 2, 1.))
+    neighbours = list(pts[index[:, 0]])
+
+    return np.mean(distances),neighbours
+
+
+def boundary_rings(polygon):
     """
-    def get_kth(pt,zone):
-        dist_pt = [(sph.distance(pt, e, radius=self.planetary_radius),e)
-                   for id in zone if id in hpd
-                   for e in hpd[id]]
-        sorted_dist_pt = sorted(dist_pt, key=lambda x: x[0])
-        return sorted_dist_pt[k]
-
-    neighbours = []
-    distances = []
-
-    debug=0
-
-    try:
-        for id,pt in zip(ids,pts):
-            locality = set()
-            outer = {id}
-            debug=1
-            while True:
-                locality |= outer # union
-                n = sum(len(hpd[e]) for e in locality if e in hpd)
-                debug = 2
-                if n >= k+1:
-                    break
-                hpx_neighbours = set(self.hp.neighbours(tuple(outer)).flatten())
-                outer = hpx_neighbours - locality
-                debug = 3
-
-            d0,pt0 = get_kth(pt,locality)
-            debug = 4
-
-            # redefine neighbourhood based on known kth closest: if pt near edge, could be over hpx cell boundary
-            hpx_neighbours = self.hp.cone_search_lonlat(sph.get_x(pt) * u.deg, sph.get_y(pt) * u.deg, d0/self.planetary_radius * u.rad)
-            d1, pt1 = get_kth(pt, hpx_neighbours)
-            debug = 5
-            neighbours += [pt1]
-            distances += [d1]
-
-        mean_distance = np.mean(distances)
-    except:
-        print(f"Error occurred, debug={debug}")
-        raise
-
-    return mean_distance,neighbours
-
-
-def sdaa(self, pts, ids, hpd):
+    unit vectors of vertices for each ring (exterior and holes) of polygon
     """
-    find standard deviation of adjacent area (spherical)
+    rings = shp.get_rings(shp.get_parts(shp.from_wkb(sph.to_wkb(polygon))))
+    return [lonlat_to_xyz(*shp.get_coordinates(r).T) for r in rings]
+
+def boundary_vertices(polygon):
+    """
+    unit vectors of polygon boundary vertices, and half the longest edge (radians)
+    """
+    xyz = boundary_rings(polygon)
+    chord = max(np.max(np.linalg.norm(np.diff(e, axis=0), axis=1)) for e in xyz)
+    return np.concatenate(xyz), math.asin(min(chord / 2, 1.))
+
+OUTSIDE, INSIDE, BOUNDARY = 0, 1, 2 # HEALPix cell classes for point-in-polygon lookup
+CELLS_IN_AREA = 2**16 # approximate number of cells within area: more gives fewer boundary cells, but slower setup
+
+def classify_cells(polygon, xr, yr, area, planetary_radius):
+    """
+    Classify HEALPix cells over polygon range as inside, outside or crossing the boundary
+
+    Cells containing a point of the densified boundary, and their neighbours, are boundary cells: with point spacing
+    below the cell width, any cell crossed by the boundary is among them. Remaining cells take the class of their centre.
+    Cells not listed (beyond range) are treated as boundary.
+
+    :return: HEALPix grid, sorted cell ids, cell classes
+    """
+    nside = 2**max(0, math.ceil(np.log2(math.sqrt(CELLS_IN_AREA * 4 * math.pi * planetary_radius**2 / area / 12))))
+    hp = hpx.HEALPix(nside=nside, order='nested')
+    res = hp.pixel_resolution.to_value(u.rad)
+
+    p = []
+    for v in boundary_rings(polygon):
+        a, b = v[:-1], v[1:]
+        n = np.ceil(np.arccos(np.clip(np.einsum('ij,ij->i', a, b), -1., 1.)) / (res / 8)).astype(int) + 1
+        f = np.concatenate([np.arange(k) / k for k in n])[:, None]
+        p.append(np.repeat(a, n, axis=0) * (1 - f) + np.repeat(b, n, axis=0) * f)
+    x, y, z = np.concatenate(p).T
+    crossed = np.unique(hp.lonlat_to_healpix(np.arctan2(y, x) * u.rad, np.arctan2(z, np.hypot(x, y)) * u.rad))
+    neighbours = hp.neighbours(crossed).ravel()
+    boundary = np.union1d(crossed, neighbours[neighbours >= 0])
+
+    # sample range at half cell spacing to find cells
+    step = np.degrees(res / 2)
+    lat = np.arange(yr[0], yr[1] + step, step)
+    rows = [np.arange(xr[0], xr[1] + step / c, step / c) for c in np.maximum(np.cos(np.radians(lat)), 1e-3)]
+    lon = np.concatenate(rows)
+    lat = np.repeat(lat, [len(e) for e in rows])
+    cells = np.union1d(hp.lonlat_to_healpix(lon * u.deg, lat * u.deg), boundary)
+
+    state = np.full(len(cells), BOUNDARY, dtype=np.int8)
+    q = ~np.isin(cells, boundary)
+    lon, lat = hp.healpix_to_lonlat(cells[q])
+    state[q] = np.where(sph.within(sph.points(lon.to_value(u.deg), lat.to_value(u.deg)), polygon), INSIDE, OUTSIDE)
+    return hp, cells, state
+
+def within_polygon(self, x, y):
     """
+    test whether points lie in area: by cell lookup, with exact test only for points in boundary cells
+    """
+    hp, cells, state = self.polygon_cells
+    c = hp.lonlat_to_healpix(x * u.deg, y * u.deg)
+    j = np.minimum(np.searchsorted(cells, c), len(cells) - 1)
+    s = np.where(cells[j] == c, state[j], BOUNDARY)
+    inside = s == INSIDE
+    b = s == BOUNDARY
+    inside[b] = sph.within(sph.points(x[b], y[b]), self.polygon)
+    return inside
+
+def sdaa(self, pts, ids, hpd, geometry=True):
+    """
+    find standard deviation of adjacent area (spherical)
 
-    ll_radians = [(math.radians(sph.get_x(p)), math.radians(sph.get_y(p))) for p in pts]
-    xyz = np.array([(math.cos(y) * math.cos(x), math.cos(y) * math.sin(x), math.sin(y)) for x, y in ll_radians])
+    Voronoi region areas come directly from SphericalVoronoi; only regions crossing the area boundary are clipped
+    :param geometry: also return (clipped) region polygons, e.g. for plotting
+    """
+    pts = np.asarray(pts, dtype=object)
+    xyz = lonlat_to_xyz(sph.get_x(pts), sph.get_y(pts))
 
     center = np.array([0, 0, 0])
     radius = 1.0
     sv = SphericalVoronoi(xyz, radius, center, threshold=1e-9)
-    sv.sort_vertices_of_regions()
-
-    xyz_polygons = [[sv.vertices[id] for id in region] for region in sv.regions]
-    ll_polygons = [[(math.degrees(math.atan2(y, x)), math.degrees(math.asin(z))) for x, y, z in p] for p in xyz_polygons]
-    sph_polygons0 = [sph.create_polygon([(lon, lat) for lon, lat in p]) for p in ll_polygons]
-    sph_polygons = [sph.intersection(self.polygon, p) for p in sph_polygons0]
-
-    areas = [sph.area(p,radius=self.planetary_radius) for p in sph_polygons]
+    areas = sv.calculate_areas() * self.planetary_radius**2 # also sorts vertices of regions
+
+    # region lies inside area if its generator is further from the boundary than its furthest vertex (cap < hemisphere)
+    lengths = np.array([len(region) for region in sv.regions])
+    cos_angle = np.einsum('ij,ij->i', np.repeat(xyz, lengths, axis=0), sv.vertices[np.concatenate(sv.regions)])
+    circumradius = np.arccos(np.clip(np.minimum.reduceat(cos_angle, np.cumsum(lengths) - lengths), -1., 1.))
+    interior = (circumradius < math.pi / 2) & sph.within(pts, self.polygon)
+
+    # lower bound of boundary distance from nearest boundary vertex; exact distance only where inconclusive
+    b_xyz, half_segment = boundary_vertices(self.polygon)
+    chord, _ = cKDTree(b_xyz).query(xyz)
+    near = np.nonzero(interior & (2 * np.arcsin(np.minimum(chord / 2, 1.)) - half_segment <= circumradius))[0]
+    interior[near] = sph.distance(pts[near], sph.boundary(self.polygon), radius=1.) > circumradius[near]
+
+    v_lon = np.degrees(np.arctan2(sv.vertices[:, 1], sv.vertices[:, 0]))
+    v_lat = np.degrees(np.arcsin(np.clip(sv.vertices[:, 2], -1., 1.)))
+    def region_polygon(i):
+        return sph.create_polygon([(v_lon[v], v_lat[v]) for v in sv.regions[i]])
+
+    clip = np.nonzero(~interior)[0]
+    clipped = sph.intersection(self.polygon, np.array([region_polygon(i) for i in clip], dtype=object))
+    areas[clip] = sph.area(clipped, radius=self.planetary_radius)
     sdaa = np.std(areas)
 
-    return sdaa, sph_polygons
-
+    if geometry:
+        sph_polygons = [region_polygon(i) for i in range(len(pts))]
+        for i, p in zip(clip, clipped):
+            sph_polygons[i] = p
+    else:
+        sph_polygons = None
 
+    return sdaa, sph_polygons
@@ -2,12 +2,14 @@
 #  Licensed under BSD 3-Clause License. See LICENSE.txt for details.
 
 from collections import namedtuple
+import contextlib
 from datetime import datetime
-from itertools import groupby
+from itertools import chain, groupby
 import math
 import os
 import re
 import shutil
+import sys
 
 import numpy as np
 import shapefile  # pyshp
@@ -58,18 +60,16 @@ class Spatialcount:
     def readSCCfile(self):
         s = gm.read_textfile(self.filename,ignore_hash=True,strip=';', as_string=True)
         s = re.sub(r"a[-_]axis radius", "oct_a_axis_radius", s) # fix OpenCraterTool misformatting
-        c = gm.read_textstructure(s,from_string=True)
+        c = gm.read_textstructure(s,from_string=True,numeric_tables=True)
 
         crater=c['crater']
-        diam=[float(e) for e in crater['diam']]
-        frac=[float(e) for e in crater['fraction']] if 'fraction' in c else [1. for e in diam]
-        lon=[float(e) for e in crater['lon']]
-        lat = [float(e) for e in crater['lat']]
-        q=[i for i,e in sorted(enumerate(diam),key=lambda x:x[1])]     #get sorted indices
-        self.diam=[diam[e] for e in q]
-        self.fraction=[frac[e] for e in q]
-        self.lon = [lon[e] for e in q]
-        self.lat = [lat[e] for e in q]
+        diam=np.asarray(crater['diam'], dtype=float)
+        frac=np.asarray(crater['fraction'], dtype=float) if 'fraction' in c else np.ones(len(diam))
+        q=np.argsort(diam, kind='stable')     #get sorted indices
+        self.diam=diam[q].tolist()
+        self.fraction=frac[q].tolist()
+        self.lon = np.asarray(crater['lon'], dtype=float)[q].tolist()
+        self.lat = np.asarray(crater['lat'], dtype=float)[q].tolist()
 
         radius_key = next((k for k in ("a_axis_radius", "oct_a_axis_radius") if k in c), None) # remove later
         self.planetary_radius = float(c[radius_key].split(' ')[0])
@@ -122,21 +122,25 @@ class Spatialcount:
             sf = shapefile.Reader(shp)
             shapes = sf.shapes()
 
+            # vertices of all shapes in one array, with offsets of first vertex of each shape
+            offsets = np.concatenate(([0], np.cumsum([len(shape.points) for shape in shapes], dtype=int)))
+            xy = np.fromiter(chain.from_iterable(chain.from_iterable(shape.points for shape in shapes)),
+                             dtype=float, count=2 * offsets[-1]).reshape(-1, 2)
+
             if not crs.is_geographic:
                 transformer = prj.Transformer.from_crs(crs, crs.geodetic_crs, always_xy=True)
-                for shape in shapes:
-                    xy = list(zip(*shape.points))
-                    lons, lats = transformer.transform(xy[0], xy[1])
-                    shape.points = [(lon, lat) for lon, lat in zip(lons, lats)]
+                xy = np.column_stack(transformer.transform(xy[:, 0], xy[:, 1]))
 
-            return shapes, planetary_radius, mtime
+            return shapes, xy, offsets, planetary_radius, mtime
 
-        sc, rc, tc = read_shp(self.crater_file)
-        sa, ra, ta = read_shp(self.area_file)
+        sc, xyc, oc, rc, tc = read_shp(self.crater_file)
+        sa, xya, oa, ra, ta = read_shp(self.area_file)
         if rc != ra:
             raise ValueError("Crater/Area shapefile planetary radii disagree")
         self.planetary_radius = rc
         self.tc, self.ta = tc, ta
+        for shape, i0, i1 in zip(sa, oa[:-1], oa[1:]): # area shapes keep geographic vertices, for writeSCCfile
+            shape.points = list(map(tuple, xya[i0:i1].tolist()))
         self.sa = sa
 
         multipolygon = []
@@ -153,37 +157,24 @@ class Spatialcount:
         self.area = sph.area(p, radius=ra)
         self.perimeter = sph.perimeter(p, radius=ra)
 
-        diam = []
-        frac = []
-        lon = []
-        lat = []
-        transform = cst.fractional_crater_transform()
-        for shape in sc:
-            c = sph.create_polygon(shell=shape.points)
-            c_area = sph.area(c, radius=rc)
-            # diam1 = math.sqrt(4*c_area/math.pi)  # flat diameter from area: better behaviour if noisy vertex positions
-            # diam2 = sph.perimeter(c,radius = rc)/math.pi # flat diameter from perimeter: greater error if noisy vertex positions
-            diam3 = 2 * rc * math.acos(1 - c_area / (2 * math.pi * rc ** 2))  # spherical diameter from area
-
-            pt = sph.centroid(c)
-            x, y = (sph.get_x(pt), sph.get_y(pt))
-            # print(f"{len(shape.points)} {(diam2-diam1)/diam1:12.3g} {diam1:12.7g} {diam2:12.7g} {diam3:12.9g} {x:20.12f} {y:20.12f} ")
-            diam += [diam3]
-            lon += [x]
-            lat += [y]
-            if sph.covered_by(c, p):
-                f = 1
-            else:
-                area_intersection = sph.area(sph.intersection(c, p), radius=rc)
-                area_frac = area_intersection / c_area
-                f = transform.af2lf(area_frac)
-            frac += [f]
+        # all crater polygons at once (per-shape create_polygon is quicker than sph.from_wkb in spherely 0.1)
+        c = np.array([sph.create_polygon(shell=xyc[i0:i1]) for i0, i1 in zip(oc[:-1], oc[1:])], dtype=object)
+        c_area = sph.area(c, radius=rc)
+        # diam1 = np.sqrt(4*c_area/np.pi)  # flat diameter from area: better behaviour if noisy vertex positions
+        # diam2 = sph.perimeter(c,radius = rc)/np.pi # flat diameter from perimeter: greater error if noisy vertex positions
+        diam = 2 * rc * np.arccos(1 - c_area / (2 * np.pi * rc ** 2))  # spherical diameter from area
+
+        pt = sph.centroid(c)
+        lon, lat = sph.get_x(pt), sph.get_y(pt)
+
+        frac = np.ones(len(c))
+        clipped = ~sph.covered_by(c, p) # only craters crossing boundary need intersection
+        if np.any(clipped):
+            area_intersection = sph.area(sph.intersection(c[clipped], p), radius=rc)
+            frac[clipped] = cst.fractional_crater_transform().af2lf(area_intersection / c_area[clipped])
 
-        filtered = [(d,f,ln,lt) for d,f,ln,lt in zip(diam,frac,lon,lat) if f > 0]
-        if filtered:
-            self.diam, self.fraction, self.lon, self.lat = map(list, zip(*filtered))
-        else:
-            self.diam, self.fraction, self.lon, self.lat = [], [], [], []
+        q = frac > 0
+        self.diam, self.fraction, self.lon, self.lat = (e[q].tolist() for e in (diam, frac, lon, lat))
 
         self.find_enclosing_polygon()
 
@@ -216,12 +207,6 @@ class Spatialcount:
                 tag += ['ext' if j==0 else 'int'] * n
                 sub_area += [i] * n
                 i += 1
-        boundary_table = [f"{i:<5}\t{a:<5}\t{b:<4}\t{c[0]:23.15f}\t{c[1]:23.15f}"
-                          for i, (a, b, c) in enumerate(zip(sub_area, tag, pts), start=1)]
-
-        crater_table = [f"{d:<12.7g}\t{f:9.3g}\t{x:23.15f}\t{y:23.15f}\t{1}"
-                        for d, f, x, y in zip(self.diam, self.fraction, self.lon, self.lat)]
-
         # include so that can import into OpenCratertool (also requires topo_scale_factor for craters - prefer without when n/a)
         s2 = (['#', '# Extra lines for OpenCraterTool compatibility:',
                f"a-axis radius = {self.planetary_radius:0g} <km>", ]
@@ -238,17 +223,16 @@ class Spatialcount:
               f"Total_area = {self.area:0g} <km2>",
               f"Total_perimeter = {self.perimeter:0g} <km>",
               '#',] + s2 + [
-              'unit_boundary = {vertex, sub_area, tag, lon, lat']
-             + boundary_table +
-             ['}',
-              'crater = {diam, fraction, lon, lat, topo_scale_factor']
-              + crater_table +
-              ['}'])
+              'unit_boundary = {vertex, sub_area, tag, lon, lat'])
 
-        if filename:
-            gm.write_textfile(filename,s)
-        else:
-            print('\n'.join(s))
+        # tables are streamed rather than assembled in memory
+        with open(filename, 'w', encoding='utf-8') if filename else contextlib.nullcontext(sys.stdout) as file:
+            file.write('\n'.join(s))
+            lon, lat = zip(*pts) if pts else ((), ())
+            gm.write_table(file, "{0:<5}\t{1:<5}\t{2:<4}\t{3:23.15f}\t{4:23.15f}", range(1, len(pts) + 1), sub_area, tag, lon, lat)
+            file.write('\n}\ncrater = {diam, fraction, lon, lat, topo_scale_factor')
+            gm.write_table(file, "{0:<12.7g}\t{1:9.3g}\t{2:23.15f}\t{3:23.15f}\t1", self.diam, self.fraction, self.lon, self.lat)
+            file.write('\n}' if filename else '\n}\n')
 
 
     def writeSHPfiles(self, filename):
@@ -262,10 +246,10 @@ class Spatialcount:
         c.field('x_coord', 'F', 20,15)
         c.field('y_coord', 'F', 20, 15)
         c.field('tag', 'C', 20)
-        rims,wkt = self.find_rims()
-        for d, x, y, r in zip(self.diam, self.lon, self.lat, rims):
+        rim_lon, rim_lat, offsets, wkt = self.find_rims()
+        for d, x, y, i0, i1 in zip(self.diam, self.lon, self.lat, offsets[:-1], offsets[1:]):
             c.record(Diam_km=d, x_coord=x, y_coord=y, tag='standard')
-            c.poly([list(zip(*r))])
+            c.poly([np.column_stack((rim_lon[i0:i1], rim_lat[i0:i1])).tolist()])
         c.close()
         gm.write_textfile(gm.filename(fc,'pn1','.prj'),wkt)
         shutil.copy(cst.PATH + 'config/_CRATER.qml', gm.filename(fc,'pn1','.qml'))
@@ -286,31 +270,33 @@ class Spatialcount:
     def find_rims(self,craters=None,ns=100):
         """
         Calculate crater rim lon lat points given centres and diameters
+
+        :return: rim longitudes and latitudes for all craters in flat arrays, offsets of first point of each rim, wkt
         """
         lon,lat,diam = (craters.lon,craters.lat,craters.diam) if craters else (self.lon,self.lat,self.diam)
+        lon, lat, diam = (np.asarray(e, dtype=float) for e in (lon, lat, diam))
 
         theta = [2 * math.pi * i / ns for i in range(ns + 1)]
         cx, cy = np.array([(math.cos(e), math.sin(e)) for e in theta]).T
         rs = f'{self.planetary_radius * 1e3:0.0f}'
         wkt = f'GEOGCS["Spherical_GCS_{rs}", DATUM["Sphere_{rs}", SPHEROID["Sphere_{rs}", {rs}, 0]], PRIMEM["Greenwich", 0], UNIT["Degree", 0.0174532925199433]]'
         geod = prj.CRS(wkt)
-        rims = []
-        # make projection centre transformers at this spacing for speed (Distance distortion: 0.061% at 2 deg)
+        rim_lon = np.empty((len(diam), ns + 1))
+        rim_lat = np.empty((len(diam), ns + 1))
+        # group craters by projection centre on grid at this spacing, to transform each group at once (Distance distortion: 0.061% at 2 deg)
         # nb: max offset from projection centre is grid/2
         grid = 5
-        t_dict = {}
-        for d, x, y in zip(diam, lon, lat):
-            origin = (round(x/grid)*grid,round(y/grid)*grid)
-            if not origin in t_dict:
-                proj4 = f"+proj=laea +lat_ts=0 +lat_0={origin[1]} +lon_0={origin[0]} +R={self.planetary_radius * 1e3:0.0f} +units=m +no_defs"
-                laea = prj.CRS(proj4)
-                t_dict[origin] = prj.Transformer.from_crs(laea, geod, always_xy=True)  # laea.geodetic_crs
-                t_dict[(origin,'inverse')] = prj.Transformer.from_crs(geod, laea, always_xy=True)
-            dx,dy = t_dict[(origin,'inverse')].transform(x,y)
-            r = d * 1e3 / 2
-            ll_pts = t_dict[origin].transform(dx+ cx * r, dy + cy * r)
-            rims += [ll_pts]
-        return rims,wkt
+        origins, group = np.unique(np.column_stack((np.round(lon / grid), np.round(lat / grid))) * grid, axis=0, return_inverse=True)
+        group = group.ravel()
+        order = np.argsort(group, kind='stable') # crater indices, grouped
+        for origin, q in zip(origins, np.split(order, np.searchsorted(group[order], np.arange(1, len(origins))))):
+            proj4 = f"+proj=laea +lat_ts=0 +lat_0={origin[1]:g} +lon_0={origin[0]:g} +R={self.planetary_radius * 1e3:0.0f} +units=m +no_defs"
+            laea = prj.CRS(proj4)
+            dx, dy = prj.Transformer.from_crs(geod, laea, always_xy=True).transform(lon[q], lat[q])
+            r = diam[q, None] * 1e3 / 2
+            rim_lon[q], rim_lat[q] = prj.Transformer.from_crs(laea, geod, always_xy=True).transform(dx[:, None] + cx * r, dy[:, None] + cy * r)  # laea.geodetic_crs
+        offsets = np.arange(len(diam) + 1) * (ns + 1)
+        return rim_lon.ravel(), rim_lat.ravel(), offsets, wkt
 
     def polygon_to_pts(self,p0=None):
         """
@@ -373,13 +359,13 @@ class Spatialcount:
             yr0 = gm.range(list(y_exterior) + list(yr0) if yr0 else y_exterior)
 
         # do craters
-        rims,wkt = self.find_rims(craters=craters,ns=30)
-        for r in rims:
-            x, y = ortho_proj(r[0],r[1])
-            ax.plot(x, y, color=cps.palette[0], linewidth=0.3*cps.sz_ratio,zorder=2)
+        rim_lon, rim_lat, offsets, wkt = self.find_rims(craters=craters,ns=30)
+        x, y = ortho_proj(rim_lon, rim_lat)
+        # all rims as single line, separated by nan
+        ax.plot(np.insert(x, offsets[1:], np.nan), np.insert(y, offsets[1:], np.nan), color=cps.palette[0], linewidth=0.3*cps.sz_ratio,zorder=2)
 
-            xr0 = gm.range(list(x) + list(xr0) )
-            yr0 = gm.range(list(y) + list(yr0) )
+        xr0 = gm.range(np.concatenate((x, xr0)))
+        yr0 = gm.range(np.concatenate((y, yr0)))
 
         xr = np.array(gm.range(xr0)) + np.array([-1, 1]) * gm.mag(xr0) * (.1 if ax is cps.ax else .02)
         yr = np.array(gm.range(yr0)) + np.array([-1, 1]) * gm.mag(yr0) * (.1 if ax is cps.ax else .02)
@@ -9,6 +9,7 @@ from .Cratercount import Cratercount
 from .Craterplotset import Craterplotset
 from .Craterplot import Craterplot
 from .Craterpdf import Craterpdf
+from .Craterpdfset import Craterpdfset
 from .Epochs import Epochs
 from .Spatialcount import Spatialcount
 from .Randomnessanalysis import Randomnessanalysis
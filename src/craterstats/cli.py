@@ -126,6 +126,7 @@ def get_parser():
 
     parser.add_argument("-ra", "--randomness_analysis", help="source file for randomness analysis", nargs='+', action=SpacedString)
     parser.add_argument("-trials", type=int, help="number of Monte Carlo trials for randomness analysis")
+    parser.add_argument("-ra_tolerance", type=float, help="stop Monte Carlo trials for each bin once n_sigma is known to within tolerance; -trials then sets upper limit")
     parser.add_argument("-measure", help="comma-separated list of measures for randomness analysis (from m2cnd,sdaa)")
     parser.add_argument("-ra_offset", type=int, help="vertical offset for randomness analysis sub-plot in 1/20ths of decade")
     parser.add_argument("-select", help="comma-separated list of indices of ra bins to plot (use 0 for n_sigma chart)")
@@ -160,6 +161,8 @@ def decode_abbreviation(s,v,one_based=False,allow_ambiguous=False,allow_invalid=
 
 
 def construct_cps_dict(args,c,f):
+    fl = f if isinstance(f, cst.Functionslist) else None # Functionslist gives shared, cached function objects
+    if fl: f = fl.functions
     if 'presentation' in vars(args):
         if args.presentation is not None:
             c['presentation'] = cst.PRESENTATIONS[decode_abbreviation(cst.PRESENTATIONS, args.presentation,one_based=True)]
@@ -213,16 +216,16 @@ def construct_cps_dict(args,c,f):
     cs=next((e for e in f['chronology_system'] if e['name'] == c['chronology_system']), None)
     if cs is None: sys.exit('Chronology system not found:' + c['chronology_system'])
 
-    c['cf'] = cst.Chronologyfn(f, cs['cf'])
-    c['pf'] = cst.Productionfn(f, cs['pf'])
+    c['cf'] = fl.chronologyfn(cs['cf']) if fl else cst.Chronologyfn(f, cs['cf'])
+    c['pf'] = fl.productionfn(cs['pf']) if fl else cst.Productionfn(f, cs['pf'])
     i=decode_abbreviation(cst.PLANETS,cs['body'],allow_invalid=True)
     if i!=-1:
         c['global_area']=cst.SURFACE_AREAS[i]
 
     if 'equilibrium' in c and c['equilibrium'] not in (None,''):
-        c['ef'] = cst.Productionfn(f, c['equilibrium'], equilibrium=True)
+        c['ef'] = fl.productionfn(c['equilibrium'], equilibrium=True) if fl else cst.Productionfn(f, c['equilibrium'], equilibrium=True)
     if 'epochs' in c and c['epochs'] not in (None,''):
-        c['ep'] = cst.Epochs(f, c['epochs'],c['pf'],c['cf'])
+        c['ep'] = fl.epochs(c['epochs'],c['pf'],c['cf']) if fl else cst.Epochs(f, c['epochs'],c['pf'],c['cf'])
 
     if c['presentation'] == 'Hartmann':
         if hasattr(c['pf'],'xrange'): #not possible to overwrite with user choice
@@ -408,11 +411,12 @@ def randomness_analysis(args,cps,progress_queue=None):
         diff = cps.measures - {'m2cnd','sdaa'}
         if diff:
             sys.exit(f"Invalid measure: {diff}")
-    for measure in cps.measure:
-        ra.run_montecarlo(trials, measure)
-        # do each loop so as to retain data if interrupted
-        ra.calculate_stats()
-        ra.write()
+    with ra:
+        for measure in cps.measure:
+            ra.run_montecarlo(trials, measure, tolerance=args.ra_tolerance)
+            # do each loop so as to retain data if interrupted
+            ra.calculate_stats()
+            ra.write(measure)
     return ra
 
 def set_default_filename(args,cps_dict,cp_dicts):
@@ -434,38 +438,50 @@ def set_default_filename(args,cps_dict,cp_dicts):
         case _ if os.path.isdir(cps_dict['out']):
             cps_dict['out'] = os.path.normpath(v + '/' + gm.filename(default_filename,'n'))
 
+def compute_results(args, cps, progress_queue=None):
+    """
+    Compute stage of output: time-consuming calculations are done once and kept on cps, for rendering in every format
+    """
+    if args.randomness_analysis:
+        if cps.ra is None:
+            cps.ra = randomness_analysis(args, cps, progress_queue=progress_queue)
+    elif cps.presentation == 'uncertainty':
+        if cps.age_area_result is None:
+            cps.calculate_time_axis_params()
+            cps.age_area_result = cps.compute_age_area()
+
 def write_output_files(args, cps, drawn = False,progress_queue=None, age_area_result=None):
+    image_formats = [f for f in cps.format if f in {'png', 'pdf', 'svg', 'tif'}]
+
     def savefig(tag=''):
-        cps.fig.savefig(cps.out + tag + '.' + f, dpi=500, transparent=cps.transparent,
-                        bbox_inches='tight' if args.tight else None, pad_inches=.02 if args.tight else None)
-
-    for f in cps.format:
-        if f in {'png', 'pdf', 'svg', 'tif'}:
-            if args.randomness_analysis:
-                ra = randomness_analysis(args, cps,progress_queue=progress_queue)
-                selection = cst.ra_decode_selection(args.select)
-                for measure in cps.measure:
-                    if selection==[0]:
-                        ra.plot_n_sigma(cps, measure)
-                        savefig(f'-{measure}-n_sigma')
-                    else:
-                        ra.plot_montecarlo_split(cps, measure, selection=selection)
-                        savefig(f'-{measure}')
-            elif cps.presentation == 'uncertainty' and age_area_result is None: # send to single fig output for gui
-                cps.calculate_time_axis_params()
-                age_area_result = cps.compute_age_area()
-                for plt in ('k', 'err', 'age'):
-                    cps.draw()
-                    cps.age_area_plot(plt,age_area_result)
-                    savefig('_' + plt)
-            else:
-                if not drawn:
-                    cps.draw()
-                    drawn = True
-                savefig()
+        for f in image_formats:
+            cps.fig.savefig(cps.out + tag + '.' + f, dpi=500, transparent=cps.transparent,
+                            bbox_inches='tight' if args.tight else None, pad_inches=.02 if args.tight else None)
+
+    if image_formats:
+        if args.randomness_analysis:
+            compute_results(args, cps, progress_queue=progress_queue)
+            selection = cst.ra_decode_selection(args.select)
+            for measure in cps.measure:
+                if selection==[0]:
+                    cps.ra.plot_n_sigma(cps, measure)
+                    savefig(f'-{measure}-n_sigma')
+                else:
+                    cps.ra.plot_montecarlo_split(cps, measure, selection=selection)
+                    savefig(f'-{measure}')
+        elif cps.presentation == 'uncertainty' and age_area_result is None: # send to single fig output for gui
+            compute_results(args, cps, progress_queue=progress_queue)
+            for plt in ('k', 'err', 'age'):
+                cps.draw()
+                cps.age_area_plot(plt,cps.age_area_result)
+                savefig('_' + plt)
+        else:
+            if not drawn:
+                cps.draw()
+            savefig()
 
-        if f in {'csv'} and not cps.presentation == 'uncertainty':
-            cps.create_summary_table(f_out=cps.out + '.' + f)
+    if 'csv' in cps.format and not cps.presentation == 'uncertainty':
+        cps.create_summary_table(f_out=cps.out + '.csv')
 
 def print_with_highlights(s):
     for line in s:
@@ -518,7 +534,7 @@ def main(args0=None):
         return
 
     dflt = copy.deepcopy(cst.DEFAULTS)
-    cps_dict = construct_cps_dict(args, dflt['set'], fl.functions)
+    cps_dict = construct_cps_dict(args, dflt['set'], fl)
     cp_dicts = construct_plot_dicts(args,dflt['plot'], cps_dict)
 
     set_default_filename(args, cps_dict, cp_dicts)
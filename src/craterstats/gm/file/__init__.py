@@ -6,4 +6,5 @@ from .filename import filename
 from .read_textfile import read_textfile
 from .read_textstructure import read_textstructure
 from .write_textfile import write_textfile
+from .write_table import write_table
 from .get_documents_path import get_documents_path
\ No newline at end of file
@@ -33,7 +33,7 @@ def read_textfile(filename,n_lines=-1,ignore_blank=False,ignore_hash=False,strip
 
     if strip is not None:
         c = re.compile(r'(("[^"]*?")|(\'[^\']*?\')|[^;\'"]*)*') # avoid splitting within quoted string
-        s = [c.match(e)[0] for e in s]
+        s = [c.match(e)[0] if ';' in e or '"' in e or "'" in e else e for e in s]
 
     if as_string:
         s='\n'.join(s)
@@ -2,13 +2,50 @@
 #  Licensed under BSD 3-Clause License. See LICENSE.txt for details.
 
 import re
+import warnings
+
+import numpy as np
 
 from ..string.strip_quotes import strip_quotes
 from ..string.quoted_split import quoted_split
 from . import read_textfile
 
 
-def simple_value(s):
+def numeric_table(tag, s):
+    '''
+    bulk-convert ascii table into one float array per column (columns not convertible stay as string lists)
+
+    :param tag: field names
+    :param s: table rows, up to closing brace
+    :return: dictionary, or None if table has quoted strings or rows not all of full length
+    '''
+    m=re.search(r'(?m)^\s*\}', s)
+    body=s[:m.start()] if m else s
+    if '"' in body or "'" in body: return None
+    rows=body.splitlines()
+    if any(len(row.split()) != len(tag) for row in rows): return None # ragged: bulk parse would shift columns
+    n=len(rows)
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning) # older numpy warns instead of raising at non-numeric value
+            a=np.fromstring(body, sep=' ')
+    except ValueError:
+        a=np.array([])
+    if len(a) == n*len(tag):
+        return {t:a[i::len(tag)].copy() for i,t in enumerate(tag)}
+
+    a=np.array(body.split()).reshape(n, len(tag))
+    r={}
+    for i,t in enumerate(tag):
+        try:
+            r[t]=a[:,i].astype(float)
+        except ValueError:
+            r[t]=a[:,i].tolist()
+    return r
+
+
+def simple_value(s,numeric_tables=False):
     '''evaluate single (possibly multi-line) value'''
   
     if s.startswith('*'): #no need for pointer, since using lists: just ignore
@@ -27,6 +64,9 @@ def simple_value(s):
         tag0=w[0].split(',')      
         tag=[e.strip('{ ') for e in tag0]      
         
+        r=numeric_table(tag, s[len(w[0])+1:]) if numeric_tables else None
+        if r is not None: return r
+
         r={t:[] for t in tag}
         for row in w[1:]:
             v=quoted_split(row)
@@ -58,7 +98,7 @@ def merge(s1, sr):
     return sr    
 
 
-def evaluate(s):
+def evaluate(s,numeric_tables=False):
     '''evaluate first definition; join with recursively evaluated remainder'''
 
     # find keyword followed by either struct_value, multiline text_value, or simple value; then following keyword
@@ -83,32 +123,33 @@ def evaluate(s):
     
     #if structure, send contents for evaluation
     if m['struct_value'] != None:  
-        r=evaluate(m['struct_value'])
+        r=evaluate(m['struct_value'],numeric_tables)
        
     elif m['text_value'] != None: #text block
         r=m['text_value']
     
     #if simple value, evaluate directly      
-    else: r=simple_value(m['value']) #simple value
+    else: r=simple_value(m['value'],numeric_tables) #simple value
     
     #new entry
     dict1={keyword:r}     
     
     #evaluate remainder  
     remainder = s[m.start('keyword2'):] if m['keyword2'] != None else ''    
-    dict_r=evaluate(remainder)
+    dict_r=evaluate(remainder,numeric_tables)
     
     #join together  
     dict_out=merge(dict1, dict_r)
     
     return dict_out #structure from s
 
-def read_textstructure(p,from_string=False):
+def read_textstructure(p,from_string=False,numeric_tables=False):
     '''
     Read set of key-value pairs from text file
 
     :param p: filename
     :param from_string: interpret string in p directly
+    :param numeric_tables: return ascii table columns as float arrays where possible (instead of string lists)
     :return: dictionary
     '''
     
@@ -117,7 +158,7 @@ def read_textstructure(p,from_string=False):
     else:
         s=p
         
-    return evaluate(s)
+    return evaluate(s,numeric_tables)
 
 
 
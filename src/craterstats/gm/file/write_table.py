@@ -0,0 +1,21 @@
+#  Copyright (c) 2026, Greg Michael
+#  Licensed under BSD 3-Clause License. See LICENSE.txt for details.
+
+from itertools import islice
+
+def write_table(file, row_format, *columns, chunk_size=10000):
+    '''
+    stream table rows to open text file, formatting a chunk at a time (memory use independent of table length)
+
+    Each row is written preceded by newline, to follow earlier lines as written by write_textfile (no trailing newline).
+
+    :param file: open text file
+    :param row_format: format string for one row, with a field for each column, e.g. '{0:<12g}  {1:g}'
+    :param columns: equal-length sequences of values
+    :param chunk_size: number of rows formatted per write
+    :return: none
+    '''
+
+    rows = zip(*columns)
+    while chunk := list(islice(rows, chunk_size)):
+        file.write(''.join(['\n' + row_format.format(*row) for row in chunk]))
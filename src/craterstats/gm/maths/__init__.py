@@ -3,6 +3,7 @@
 
 from .normal import normal
 from .poisson import poisson
+from .log_poisson import log_poisson
 from .range import range,mag
 from .poly import poly
 from .scl import scl
@@ -0,0 +1,18 @@
+#  Copyright (c) 2026, Greg Michael
+#  Licensed under BSD 3-Clause License. See LICENSE.txt for details.
+
+import numpy as np
+from scipy.special import gammaln, xlogy
+
+def log_poisson(k,lam):
+    '''
+    natural log of poisson mass function
+    vectorised in both k and lambda (broadcast together); no underflow for large k
+
+    :param k: number(s) of events
+    :param lam: expected number(s) of events
+    :return: log pmf
+    '''
+
+    k = np.asarray(k, dtype=float)
+    return xlogy(k, lam) - lam - gammaln(k + 1.)   # xlogy gives 0*log(0)=0, so pmf(0,0)=1
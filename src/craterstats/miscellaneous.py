@@ -1,6 +1,7 @@
 #  Copyright (c) 2021-2025, Greg Michael
 #  Licensed under BSD 3-Clause License. See LICENSE.txt for details.
 
+import functools
 import os
 import re
 import sys
@@ -62,21 +63,92 @@ class fractional_crater_transform:
         plt.ylabel('area frac')
         plt.show()
 
+@functools.lru_cache(maxsize=16)
+def parse_functions(files, strip=None):
+    """
+    Parse concatenated function definition files (cached; use read_functions)
+
+    :param files: tuple of (path, modification time) pairs
+    :param strip: comment symbol, as for gm.read_textfile
+    :return: structure from gm.read_textstructure
+    """
+    s = '\n'.join([gm.read_textfile(path, ignore_hash=True, strip=strip, as_string=True) for path, _ in files])
+    return gm.read_textstructure(s, from_string=True)
+
+def functions_key(paths):
+    """
+    Key identifying current contents of function definition files
+
+    :param paths: list of file paths
+    :return: tuple of (absolute path, modification time) pairs
+    """
+    return tuple((os.path.abspath(e), os.path.getmtime(e)) for e in paths)
+
+def read_functions(*paths, strip=None):
+    """
+    Read function definition file(s), parsing each version only once per process
+
+    Files are re-parsed only if modified. The returned structure is shared: do not modify it.
+
+    :param paths: file path(s), concatenated in order
+    :param strip: comment symbol, as for gm.read_textfile
+    :return: structure from gm.read_textstructure
+    """
+    return parse_functions(functions_key(paths), strip)
+
+@functools.lru_cache(maxsize=64)
+def function_object(key, strip, kind, name, *args):
+    """
+    Construct function object from cached definitions (cached; use Functionslist methods)
+
+    :param key: from functions_key()
+    :param strip: comment symbol used for parsing
+    :param kind: 'chronology', 'production', 'equilibrium' or 'epochs'
+    :param name: function name
+    :param args: additional arguments for constructor (pf, cf for epochs)
+    :return: Chronologyfn, Productionfn or Epochs object
+    """
+    src = parse_functions(key, strip)
+    match kind:
+        case 'chronology':
+            return cst.Chronologyfn(src, name)
+        case 'production':
+            return cst.Productionfn(src, name)
+        case 'equilibrium':
+            return cst.Productionfn(src, name, equilibrium=True)
+        case 'epochs':
+            return cst.Epochs(src, name, *args)
+
+
 class Functionslist:
     """
     manage functions/user_functions lists
+
+    Definitions and function objects are shared process-wide, and only re-read if the files change.
+    Function objects should be treated as read-only.
     """
     def __init__(self):
-        s = gm.read_textfile(cst.PATH+'config/functions.txt', ignore_hash=True, strip=';', as_string=True)
+        self.paths = [cst.PATH+'config/functions.txt']
         self.config = self.user_function_config()
         if self.config:
             uf = gm.read_textfile(self.config, ignore_hash=True)[0] if gm.file_exists(self.config) else None
             if uf:
                 try:
-                    s = s + gm.read_textfile(uf, ignore_hash=True, strip=';', as_string=True)
+                    read_functions(*self.paths, uf, strip=';')
+                    self.paths.append(uf)
                 except:
-                    print("Unable to read user functions file: "+functions_user+" - ignoring.")
-        self.functions = gm.read_textstructure(s,from_string=True)
+                    print("Unable to read user functions file: "+uf+" - ignoring.")
+        self.key = functions_key(self.paths)
+        self.functions = parse_functions(self.key, ';')
+
+    def chronologyfn(self, name):
+        return function_object(self.key, ';', 'chronology', name)
+
+    def productionfn(self, name, equilibrium=False):
+        return function_object(self.key, ';', 'equilibrium' if equilibrium else 'production', name)
+
+    def epochs(self, name, pf, cf):
+        return function_object(self.key, ';', 'epochs', name, pf, cf)
 
     def user_function_config(self):
         if os.environ.get('CONDA_PREFIX'):  # conda environment
@@ -149,11 +221,12 @@ def merge_cratercounts(args,equal_weight=False):
            + [f"area = {a}"]
            + [f"perimeter = {p}"]
            + ['#',"crater = {diameter, fraction"]
-           + [f"{a:<12g}  {b:g}" for a,b in zip(d,frac)]
-           + ['}']
          )
 
-    gm.write_textfile(out,s)
+    with open(out, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(s))
+        gm.write_table(file, "{0:<12g}  {1:g}", d, frac)
+        file.write('\n}')
     print('Merged file: '+out)
 
 
@@ -20,6 +20,8 @@ class TestCraterFunctionObjects(unittest.TestCase):
         self.assertEqual(cf.a0(3.), np.log10(N1))
         self.assertAlmostEqual(cf.phi(0.), 8.38E-4)
         self.assertAlmostEqual(cf.t(n1=N1), 3.,places=4)
+        t = np.array([0., 1e-7, 1e-3, 3., 5.5])
+        self.assertTrue(np.allclose(cf.t(n1=cf.N1(t), newton=True), t, rtol=1e-12, atol=0))
 
         #user defined function - had to remove lambdas for multiprocessing. Reconsider implementation when needed
         # f = textwrap.dedent("""
@@ -61,6 +63,40 @@ class TestCraterFunctionObjects(unittest.TestCase):
         ep = cst.Epochs(self.file_fns, 'Mars, Michael (2013)', pf, cf)
         self.assertTrue(np.allclose(ep.time,[0.0, 0.328, 1.23, 3.37, 3.61, 3.71, 3.83, 3.94],rtol=.01)) # (Michael, 2013)
 
+    def test_Craterpdfset(self):
+        cf = cst.Chronologyfn(self.file_fns, 'Mars, Hartmann & Neukum (2001)')
+        pf = cst.Productionfn(self.file_fns, 'Mars, Ivanov (2001)')
+        k, area, d_range = [0, 3, 223, 5000], [100., 3036.6, 3036.6, 1e5], [.22, .43]
+        pdfs = cst.Craterpdfset(pf, cf, k, area, d_range)
+        cc = cst.Cratercount()
+        cc.diam = [1.]
+        for i in range(len(k)):
+            cc.area = area[i]
+            pdf = cst.Craterpdf(pf, cf, cc, d_range, k=k[i])
+            self.assertTrue(np.allclose(pdfs.median1sigma()[i], pdf.median1sigma(), rtol=1e-10))
+            self.assertAlmostEqual(pdfs.t(.5)[i], pdf.t(.5))
+
+    def test_Craterpdf_grid_cache(self):
+        cf = cst.Chronologyfn(self.file_fns, 'Mars, Hartmann & Neukum (2001)')
+        pf = cst.Productionfn(self.file_fns, 'Mars, Ivanov (2001)')
+        lam = cst.Craterpdf.unit_lambda(pf, cf, np.array([.22, .43]), 2000)
+        self.assertIs(cst.Craterpdf.unit_lambda(pf, cf, [.22, .43], 2000), lam) # shared between calls
+        self.assertFalse(lam.flags.writeable)
+        self.assertIs(cst.Craterpdf.time_grid(cf, 2000)[2], cst.Craterpdf.time_grid(cf, 2000)[2])
+
+    def test_Craterpdf_adaptive(self):
+        cf = cst.Chronologyfn(self.file_fns, 'Mars, Hartmann & Neukum (2001)')
+        pf = cst.Productionfn(self.file_fns, 'Mars, Ivanov (2001)')
+        cc = cst.Cratercount()
+        cc.diam = [1.]
+        cc.area = 3036.6
+        g = [.003] + cst.Craterpdf.gaussian_percentiles(2) + [.997]
+        for k in [0, 3, 223, 50000]:
+            pdf = cst.Craterpdf(pf, cf, cc, [.22, .43], k=k)
+            apdf = cst.Craterpdf(pf, cf, cc, [.22, .43], k=k, adaptive=True, tolerance=1e-6)
+            self.assertLess(len(apdf.ts), len(pdf.ts))
+            self.assertTrue(np.allclose(apdf.t(g), pdf.t(g), rtol=1e-3))
+            self.assertAlmostEqual(pdf.calculate_sequence_probability(apdf), .5, places=5)
 
 
 if __name__ == '__main__':
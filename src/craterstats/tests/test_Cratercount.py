@@ -1,6 +1,8 @@
 #  Copyright (c) 2021-2025, Greg Michael
 #  Licensed under BSD 3-Clause License. See LICENSE.txt for details.
 
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, mock_open
 import textwrap
@@ -106,6 +108,42 @@ class TestCratercount(unittest.TestCase):
         self.assertFalse(cc.buffered)
         self.assertTrue(np.array_equal(cc.fraction, [1., 1.]))
 
+    def test_cache(self):
+        scc = textwrap.dedent("""
+            Total_area = 224669.2 <km^2>
+            Perimeter = 2143.1 <km>
+            crater = {diam,fraction,lon,lat
+            40.40 1. -124.4 16.95
+            33.58 .5 -126.0 16.81
+            }
+            """)
+        diam = textwrap.dedent("""
+            area = 100.
+            crater = {diameter, fraction
+            1.1 0.3
+            2.4 1.
+            }
+            """)
+        with tempfile.TemporaryDirectory() as d:
+            for name, c in (('test.scc', scc), ('test.diam', diam)):
+                f = os.path.join(d, name)
+                with open(f, 'w') as fh: fh.write(c)
+                cc = cst.Cratercount(f, cache=True)
+                self.assertFalse(cc.cached)
+                self.assertTrue(os.path.exists(f + '.npz'))
+                cc2 = cst.Cratercount(f, cache=True)
+                self.assertTrue(cc2.cached)
+                for k in cst.Cratercount.CACHED: # same as uncached, types included
+                    self.assertEqual(getattr(cc2, k, None), getattr(cc, k, None))
+                    self.assertIs(type(getattr(cc2, k, None)), type(getattr(cc, k, None)))
+                with open(f, 'a') as fh: fh.write('\n') # modified source invalidates cache
+                self.assertFalse(cst.Cratercount(f, cache=True).cached)
+
+            f = os.path.join(d, 'invalid.diam') # invalid fraction: not cached, so checked on every read
+            with open(f, 'w') as fh: fh.write(diam.replace('0.3', '1.3'))
+            self.assertTrue(cst.Cratercount(f, cache=True).errormsg)
+            self.assertFalse(os.path.exists(f + '.npz'))
+
     def make_flat_distribution(self):
         self.N_CRATERS=100
         cc = cst.Cratercount('')
@@ -6,6 +6,7 @@ from unittest.mock import patch
 import textwrap
 
 import io
+import queue
 import numpy as np
 
 import craterstats as cst
@@ -63,3 +64,17 @@ class TestPlottingClasses(unittest.TestCase):
 
 
 
+
+    def test_age_area_grid_parallel(self):
+        from craterstats.Craterplotset import age_area_grid
+        log_age = np.linspace(-1, .5, 3)
+        area = np.logspace(2, 4, 4)
+        d_range = [.3, 1000.]
+        C = [np.subtract(*self.pf.evaluate("cumulative", d_range, a0=a)) for a in self.cf.a0(10**log_age)]
+        lm = np.outer(C, area)
+        serial = age_area_grid(self.pf, self.cf, d_range, lm, area, log_age, parallel=False)
+        progress = queue.Queue()
+        parallel = age_area_grid(self.pf, self.cf, d_range, lm, area, log_age, parallel=True, progress_queue=progress)
+        for a, b in zip(serial, parallel):
+            self.assertTrue(np.array_equal(a, b))
+        self.assertEqual([progress.get() for _ in range(progress.qsize())], [("progress", i + 1, 3) for i in range(3)]) # per row
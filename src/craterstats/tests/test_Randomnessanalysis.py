@@ -0,0 +1,251 @@
+#  Copyright (c) 2026, Greg Michael
+#  Licensed under BSD 3-Clause License. See LICENSE.txt for details.
+
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+import numpy as np
+import spherely as sph
+
+import craterstats as cst
+
+ra_module = sys.modules['craterstats.Randomnessanalysis'] # module, as distinct from class of same name
+
+class TestRandomnessanalysis(unittest.TestCase):
+
+    root = cst.gm.filename(cst.__file__, 'p')
+    source = root + 'sample/Pickering.scc'
+
+    def test_checkpoint_resume(self):
+        with tempfile.TemporaryDirectory() as d:
+            out = os.path.join(d, 'pk')
+            ra = cst.Randomnessanalysis(self.source, out=out)
+            bins = [f"{np.log2(b):.3g}" for b, n in zip(ra.cc.binned['d_min'], ra.cc.binned['n_event']) if n >= 3]
+            rng = np.random.default_rng(0)
+            partial = {f"{m}/{b}": rng.normal(size=3) for m in ra.MEASURES for b in bins} # as if interrupted
+            ra.checkpoint = dict(partial)
+            ra.write_checkpoint()
+
+            # first measure completed from checkpoint: entries for second measure kept
+            ra = cst.Randomnessanalysis(self.source, out=out)
+            self.assertEqual(ra.checkpoint.keys(), partial.keys())
+            ra.run_montecarlo(3, 'm2cnd')
+            ra.calculate_stats()
+            ra.write('m2cnd')
+            self.assertEqual(set(ra.checkpoint), {k for k in partial if k.startswith('sdaa/')})
+            self.assertTrue(os.path.exists(ra.checkpoint_file))
+
+            # second measure completed in new session: checkpoint removed
+            ra = cst.Randomnessanalysis(self.source, out=out)
+            self.assertEqual(set(ra.checkpoint), {k for k in partial if k.startswith('sdaa/')})
+            ra.run_montecarlo(3, 'sdaa')
+            ra.calculate_stats()
+            ra.write('sdaa')
+            self.assertFalse(os.path.exists(ra.checkpoint_file))
+
+            ra = cst.Randomnessanalysis(self.source, out=out)
+            for k, v in partial.items():
+                m, b = k.split('/')
+                if b in ra.montecarlo[m]['trials']:
+                    self.assertTrue(np.array_equal(ra.montecarlo[m]['trials'][b], v))
+
+    def test_checkpoint_other_measure(self):
+        with tempfile.TemporaryDirectory() as d:
+            out = os.path.join(d, 'pk')
+            ra = cst.Randomnessanalysis(self.source, out=out)
+            bins = [f"{np.log2(b):.3g}" for b, n in zip(ra.cc.binned['d_min'], ra.cc.binned['n_event']) if n >= 3]
+            rng = np.random.default_rng(0)
+            ra.checkpoint = {f"{m}/{b}": rng.normal(size=3) for m in ra.MEASURES for b in bins}
+            for m in ra.MEASURES: # earlier results for both measures
+                ra.run_montecarlo(3, m)
+                ra.calculate_stats()
+                ra.write(m)
+
+            # more trials: m2cnd complete, sdaa interrupted
+            ra.checkpoint = {f"m2cnd/{b}": rng.normal(size=6) for b in bins} | {f"sdaa/{b}": rng.normal(size=4) for b in bins}
+            ra.write_checkpoint()
+            ra = cst.Randomnessanalysis(self.source, out=out)
+            self.assertEqual(list(ra.montecarlo)[-1], 'sdaa') # completed measure is not last
+            ra.run_montecarlo(6, 'm2cnd')
+            ra.calculate_stats()
+            ra.write('m2cnd')
+            self.assertEqual(set(ra.checkpoint), {f"sdaa/{b}" for b in bins})
+            self.assertEqual(set(cst.Randomnessanalysis(self.source, out=out).checkpoint), {f"sdaa/{b}" for b in bins})
+
+    def test_checkpoint_other_source(self):
+        with tempfile.TemporaryDirectory() as d:
+            out = os.path.join(d, 'pk')
+            ra = cst.Randomnessanalysis(self.source, out=out)
+            ra.checkpoint = {'m2cnd/0': np.zeros(3)}
+            ra.write_checkpoint()
+            other = os.path.join(d, 'other.scc')
+            shutil.copy(self.source, other)
+            self.assertEqual(cst.Randomnessanalysis(other, out=out).checkpoint, {})
+
+    def test_read_trials(self):
+        with tempfile.TemporaryDirectory() as d:
+            out = os.path.join(d, 'pk')
+            ra = cst.Randomnessanalysis(self.source, out=out)
+            bins = [f"{np.log2(b):.3g}" for b, n in zip(ra.cc.binned['d_min'], ra.cc.binned['n_event']) if n >= 3]
+            rng = np.random.default_rng(0)
+            ra.checkpoint = {f"m2cnd/{b}": rng.normal(size=3) for b in bins} # trials taken from checkpoint, not run
+            ra.run_montecarlo(3, 'm2cnd')
+            ra.calculate_stats()
+            ra.write('m2cnd')
+            stats = ra.montecarlo['m2cnd']['stats']
+
+            # saved stats reused, with geometry recalculated
+            ra = cst.Randomnessanalysis(self.source, out=out)
+            self.assertTrue(ra.have_trials('m2cnd', 3))
+            ra.run_montecarlo(3, 'm2cnd')
+            ra.calculate_stats()
+            for b, e in ra.montecarlo['m2cnd']['stats'].items():
+                self.assertEqual(e._replace(p2=None), stats[b]._replace(p2=None))
+                self.assertIsNotNone(e.p2)
+            self.assertNotIn('polygon_cells', vars(ra)) # no trials run: cell classification not needed
+
+            # missing trial values: measure to be recalculated
+            os.remove(ra.trials_file)
+            ra = cst.Randomnessanalysis(self.source, out=out)
+            self.assertNotIn('m2cnd', ra.montecarlo)
+            self.assertFalse(ra.have_trials('m2cnd', 3))
+
+    def test_within_polygon(self):
+        def check(polygon, xr, yr, area, planetary_radius, extra=()):
+            cells = ra_module.classify_cells(polygon, xr, yr, area, planetary_radius)
+            rng = np.random.default_rng(0)
+            x, y = rng.uniform(*xr, 20000), rng.uniform(*yr, 20000)
+            for v in extra: # points scattered closely about boundary vertices
+                x, y = np.append(x, v[0] + rng.normal(scale=1e-6, size=50)), np.append(y, v[1] + rng.normal(scale=1e-6, size=50))
+            self_pp = types.SimpleNamespace(polygon=polygon, polygon_cells=cells) # only attributes used
+            hp, ids, state = cells
+            j = np.minimum(np.searchsorted(ids, hp.lonlat_to_healpix(x * ra_module.u.deg, y * ra_module.u.deg)), len(ids) - 1)
+            self.assertTrue(np.any(state[j] == ra_module.BOUNDARY)) # exact test exercised
+            self.assertTrue(np.array_equal(ra_module.within_polygon(self_pp, x, y), sph.within(sph.points(x, y), polygon)))
+
+        shell = [(10, 10), (12, 10), (12, 12), (10, 12)]
+        hole = [(10.5, 10.5), (10.5, 11.5), (11.5, 11.5), (11.5, 10.5)]
+        polygon = sph.create_polygon(shell, holes=[hole])
+        check(polygon, (9.9, 12.1), (9.9, 12.1), sph.area(polygon, radius=1737.4), 1737.4, extra=shell + hole)
+
+        with tempfile.TemporaryDirectory() as d:
+            ra = cst.Randomnessanalysis(self.source, out=os.path.join(d, 'pk'))
+        check(ra.polygon, ra.xr, ra.yr, ra.area, ra.planetary_radius)
+
+    def test_sprinkle_discs(self):
+        def sprinkle_reference(self_pp, n, diam, rng): # place points one at a time, as before batching
+            placed = []
+            while len(placed) < n:
+                z = int(1.2 * (n - len(placed)) * self_pp.enclosing_area / self_pp.area) + 10 # same draws as sprinkle_discs_pp
+                x, y = ra_module.random_points_pp(self_pp, z, rng=rng)
+                for pt in sph.points(x, y)[sph.within(sph.points(x, y), self_pp.polygon)]:
+                    placed = [e for e in placed if sph.distance(pt, e, radius=self_pp.planetary_radius) > diam / 2] + [pt]
+                    if len(placed) >= n:
+                        break
+            return placed
+
+        with tempfile.TemporaryDirectory() as d:
+            ra = cst.Randomnessanalysis(self.source, out=os.path.join(d, 'pk'))
+        ra.establish_hpx(100)
+        self_pp = ra.self_pp(100, 'm2cnd', sprinkle=True)
+        for n, diam in ((40, 12.), (200, 2.)): # heavy and light overlap
+            pts, ids, hpd = ra_module.sprinkle_discs_pp(self_pp, n, diam, rng=np.random.default_rng(1))
+            ref = sprinkle_reference(self_pp, n, diam, np.random.default_rng(1))
+            self.assertEqual(len(pts), n)
+            self.assertEqual(sorted(zip(sph.get_x(pts), sph.get_y(pts))), sorted(zip(sph.get_x(ref), sph.get_y(ref))))
+            self.assertEqual(sorted(ids), sorted(ra.hp.lonlat_to_healpix(sph.get_x(ref) * ra_module.u.deg, sph.get_y(ref) * ra_module.u.deg)))
+
+    def test_kth_nearest_neighbour(self):
+        with tempfile.TemporaryDirectory() as d:
+            ra = cst.Randomnessanalysis(self.source, out=os.path.join(d, 'pk'))
+        ra.establish_hpx(100)
+        self_pp = ra.self_pp(100, 'm2cnd')
+        x, y = ra_module.random_points_pp(self_pp, 300, rng=np.random.default_rng(2))
+        pts = sph.points(x, y)
+        dist = sph.distance(pts[:, None], pts[None, :], radius=ra.planetary_radius) # all pairs
+        for k in (1, 2, 5):
+            mean_distance, neighbours = ra_module.kth_nearest_neighbour_pp(self_pp, list(pts), None, None, k=k)
+            j = np.argsort(dist, axis=1)[:, k] # nearest (k=0) is point itself
+            self.assertAlmostEqual(mean_distance, np.mean(dist[np.arange(len(pts)), j]), delta=1e-9 * mean_distance)
+            self.assertTrue(all(sph.equals(a, b) for a, b in zip(neighbours, pts[j])))
+
+    def test_sdaa(self):
+        with tempfile.TemporaryDirectory() as d:
+            ra = cst.Randomnessanalysis(self.source, out=os.path.join(d, 'pk'))
+        ra.establish_hpx(100)
+        self_pp = ra.self_pp(100, 'sdaa')
+        x, y = ra_module.random_points_pp(self_pp, 400, rng=np.random.default_rng(3))
+        pts = sph.points(x, y)[sph.within(sph.points(x, y), ra.polygon)]
+
+        # reference: clip every Voronoi region by area
+        sv = ra_module.SphericalVoronoi(ra_module.lonlat_to_xyz(sph.get_x(pts), sph.get_y(pts)), 1., np.zeros(3), threshold=1e-9)
+        sv.sort_vertices_of_regions()
+        lon, lat = np.degrees(np.arctan2(sv.vertices[:, 1], sv.vertices[:, 0])), np.degrees(np.arcsin(sv.vertices[:, 2]))
+        regions = [sph.create_polygon(list(zip(lon[r], lat[r]))) for r in sv.regions]
+        areas = np.array([sph.area(sph.intersection(ra.polygon, p), radius=ra.planetary_radius) for p in regions])
+
+        value, polygons = ra_module.sdaa(self_pp, list(pts), None, None)
+        self.assertAlmostEqual(value, np.std(areas), delta=1e-9 * value)
+        self.assertTrue(np.allclose(sph.area(np.array(polygons, dtype=object), radius=ra.planetary_radius), areas, rtol=1e-9))
+        self.assertEqual(ra_module.sdaa(self_pp, list(pts), None, None, geometry=False), (value, None))
+
+    def test_trial_rng(self):
+        draw = lambda *key: ra_module.trial_rng(*key).uniform(size=5)
+        self.assertTrue(np.array_equal(draw('m2cnd', '-1', 7), draw('m2cnd', '-1', 7)))
+        for other in (('m2cnd', '-1', 8), ('m2cnd', '-1.5', 7), ('sdaa', '-1', 7)):
+            self.assertFalse(np.array_equal(draw('m2cnd', '-1', 7), draw(*other)))
+
+    def test_trials_reproducible(self):
+        with tempfile.TemporaryDirectory() as d:
+            ra = cst.Randomnessanalysis(self.source, out=os.path.join(d, 'pk'))
+        ra.establish_hpx(6)
+        self_pp = ra.self_pp(6, 'm2cnd', sprinkle=True)
+        b, n = next((b, n) for b, n in zip(ra.cc.binned['d_min'], ra.cc.binned['n_event']) if n >= 3)
+
+        m = ra_module.montecarlo_serial(self_pp, b, n)
+        self.assertEqual(len(m), 6)
+        self.assertEqual([ra_module.run_trial(self_pp, b, n, i) for i in range(5, -1, -1)], m[::-1]) # order independent
+        self.assertEqual(ra_module.montecarlo_serial(self_pp, b, n, start=4), m[4:]) # resumed run
+
+        # blocks of trials in worker processes give same values as serial run
+        self.assertEqual(ra_module.montecarlo_pp(self_pp._replace(max_threads=2), b, n, start=1), m[1:])
+
+    def test_chunks(self):
+        for start, stop, n_workers in ((0, 10, 1), (3, 1000, 4), (0, 5000, 2), (7, 8, 16)):
+            blocks = ra_module.chunks(start, stop, n_workers)
+            self.assertEqual([i for b in blocks for i in b], list(range(start, stop)))
+            self.assertTrue(all(len(b) <= ra_module.MAX_CHUNK for b in blocks))
+            self.assertTrue(len(blocks) >= min(4 * n_workers, stop - start) or len(blocks[0]) == ra_module.MAX_CHUNK)
+
+    def test_converged(self):
+        converged = cst.Randomnessanalysis.converged
+        m = np.random.default_rng(0).normal(size=400)
+        self.assertFalse(converged(0., m[:ra_module.ADAPTIVE_BATCH - 1], 1.)) # minimum number of trials
+        self.assertTrue(converged(0., m, .1))
+        self.assertFalse(converged(0., m, .05))
+        self.assertTrue(converged(10., m[:ra_module.ADAPTIVE_BATCH], .2)) # tolerance relative to large n_sigma
+
+    def test_convergence_stop(self):
+        with tempfile.TemporaryDirectory() as d:
+            ra = cst.Randomnessanalysis(self.source, out=os.path.join(d, 'pk'))
+            ra.establish_hpx(300)
+            self_pp = ra.self_pp(300, 'm2cnd', sprinkle=True)
+            rng = np.random.default_rng(0)
+            previous = {}
+            for b, n in zip(ra.cc.binned['d_min'], ra.cc.binned['n_event']):
+                if n >= 3:
+                    bin = f"{np.log2(b):.3g}"
+                    m0, _ = ra_module.evaluate_randomness(self_pp, *ra.get_bin_craters(bin), geometry=False)
+                    previous[bin] = m0 + 10 + rng.normal(size=ra_module.ADAPTIVE_BATCH) # clearly non-random
+            ra.montecarlo['m2cnd'] = {'n_trials': 300}
+            ra.montecarlo_split('m2cnd', self_pp, previous=previous, tolerance=.2)
+            self.assertEqual({k: len(v) for k, v in ra.montecarlo['m2cnd']['trials'].items()},
+                             {k: ra_module.ADAPTIVE_BATCH for k in previous}) # stopped without further trials
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
 #  Copyright (c) 2021-2025, Greg Michael
 #  Licensed under BSD 3-Clause License. See LICENSE.txt for details.
 
+import os
+import shutil
+import tempfile
+import time
 import unittest
 
 import numpy as np
@@ -21,5 +25,20 @@ class TestCraterstats(unittest.TestCase):
         self.assertEqual(cst.str_age(1., simple=True), '1 Ga')
         self.assertEqual(cst.str_age(.314, .11, .14,sf=2),'$310^{+100}_{-100}$ Ma')
 
+    def test_read_functions(self):
+        with tempfile.TemporaryDirectory() as d:
+            f = os.path.join(d, 'functions.txt')
+            shutil.copy(cst.PATH + 'config/functions.txt', f)
+            src = cst.read_functions(f)
+            self.assertIs(cst.read_functions(f), src) # parsed once
+            cf = cst.Chronologyfn(f, 'Moon, Neukum (1983)')
+            self.assertEqual(cf.definition, next(e for e in src['chronology'] if e['name'] == 'Moon, Neukum (1983)'))
+            os.utime(f, (time.time() + 10, time.time() + 10))
+            self.assertIsNot(cst.read_functions(f), src) # re-parsed after modification
+
+        fl = cst.Functionslist()
+        self.assertIs(fl.chronologyfn('Moon, Neukum (1983)'), cst.Functionslist().chronologyfn('Moon, Neukum (1983)'))
+        self.assertEqual(fl.productionfn('Moon, Neukum (1983)').name, 'Moon, Neukum (1983)')
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,7 @@
 #  Copyright (c) 2021-2025, Greg Michael
 #  Licensed under BSD 3-Clause License. See LICENSE.txt for details.
 
+import io
 import unittest
 from unittest.mock import patch, mock_open
 
@@ -48,6 +49,14 @@ class Testgm(unittest.TestCase):
         # self.assertTrue(np.allclose(gm.poisson(25, 3., threshold=23, cumulative=True),
         #                                gm.normal(3., np.sqrt(3.), 25, cumulative=True) ))
 
+    def test_log_poisson(self):
+        k=np.array([0,3,3,40])
+        lam=np.array([0.,1.,1.5,35.])
+        self.assertTrue(np.allclose(gm.log_poisson(k, lam), np.log(gm.poisson(k, lam)), rtol=1e-12, atol=0))
+        self.assertTrue(np.array_equal(gm.log_poisson(k[:, None], lam).shape, (4, 4)))
+        self.assertEqual(gm.poisson(1e6, 9e5), 0.)   # underflows in linear space
+        self.assertTrue(np.isfinite(gm.log_poisson(1e6, 9e5)))
+
     def test_normal(self):
         self.assertGreater(gm.normal(10., 1., 10.),gm.normal(10., 1., 9.9))
         self.assertEqual(gm.normal(10.,1.,10.,cumulative=True),0.5)
@@ -136,6 +145,12 @@ class Testgm(unittest.TestCase):
             gm.write_textfile(f, ['a','b'])
             m().writelines.assert_called_with('a\nb')
 
+    def test_write_table(self):
+        f = io.StringIO()
+        f.write('table = {a, b')
+        gm.write_table(f, '{0:<4g}{1}', np.array([1.5, 2., 3.]), ['x', 'y', 'z'], chunk_size=2)
+        self.assertEqual(f.getvalue(), 'table = {a, b\n1.5 x\n2   y\n3   z')
+
     def test_read_textfile(self):
         f = r'd:\tmp\test.txt'
         c = '1\n2\n#test\n\n5 ;comment'
@@ -176,5 +191,18 @@ m2cnd={
 """
         self.assertEqual(gm.read_textstructure(test, from_string=True),{'m2cnd': {'trials':'50', 'results':{'bin':['-3.5','-3'], 'n_sigma':['-3.19','-0.218']}}})
 
+        # numeric tables
+        r = gm.read_textstructure(test, from_string=True, numeric_tables=True)['m2cnd']['results']
+        self.assertTrue(np.array_equal(r['bin'], [-3.5, -3.]) and np.array_equal(r['n_sigma'], [-3.19, -0.218]))
+        r = gm.read_textstructure('b={n,tag,lon\n1 ext 3.5\n2 int -4\n}', from_string=True, numeric_tables=True)['b']
+        self.assertTrue(np.array_equal(r['n'], [1., 2.]) and np.array_equal(r['lon'], [3.5, -4.]))
+        self.assertEqual(r['tag'], ['ext', 'int'])
+        self.assertEqual(gm.read_textstructure('wifi={mac,name\n04f02a418c2e "ABC Wi-Fi"\n}', from_string=True, numeric_tables=True),
+            {'wifi': {'mac': ['04f02a418c2e'], 'name': ['ABC Wi-Fi']}})
+        ragged = 'r={a,b,c\n1 2 3 4\n5 6\n}' # same total count as full table: must not be bulk parsed
+        self.assertEqual(gm.read_textstructure(ragged, from_string=True, numeric_tables=True),
+                         gm.read_textstructure(ragged, from_string=True))
+        self.assertEqual(gm.read_textstructure(ragged, from_string=True)['r'], {'a': ['1', '5'], 'b': ['2', '6'], 'c': ['3', '']})
+
 if __name__ == '__main__':
     unittest.main()